@@ -0,0 +1,251 @@
+import json
+import mmap
+import os
+import struct
+import sys
+import threading
+import pygame
+from pygame import mixer
+from game import WIDTH, HEIGHT
+
+# Pre-baked asset pack. The build step decodes everything in the assets folder
+# once and writes the raw pixels and samples into a single file:
+#
+#   magic, version, index length | JSON index | blobs
+#
+# The index maps each source file name to where its data lives. Sprites are
+# packed into one RGBA atlas, backgrounds are stored already scaled to their
+# render size, and sounds hold the mixer's decoded samples. The intro GIF is
+# not packed: it is streamed from the GIF itself (see gifstream.py), and every
+# frame of a long GIF stored at full size would make the pack huge.
+# At startup the pack is mapped with mmap and surfaces are made straight from
+# the mapping with pygame.image.frombuffer, so nothing is decoded or scaled.
+#
+# The index also records the size and modification time of every source file
+# and the mixer format the samples were decoded for. If any of them changed,
+# the pack is not used: that run loads the sources directly while the pack is
+# rebuilt in the background for the next one.
+
+MAGIC = b"DBPK"
+VERSION = 1
+HEADER = struct.Struct("<4sII")
+PACK_NAME = "assets.pack"
+
+# Sprites that go into the atlas, at their native size
+ATLAS_SPRITES = ["spaceship.png", "moneybag.png", "superseed.png", "loanshark.png", "bullet.png", "por.png"]
+ATLAS_WIDTH = 1024
+ATLAS_PADDING = 1
+
+# Full-screen images, scaled to their render size
+IMAGES = {"background.png": (WIDTH, HEIGHT), "end_background.png": (WIDTH, HEIGHT)}
+
+SOUNDS = ["intro_narration.mp3", "bullet_shot.wav", "hit.wav", "powerup.wav", "penalty.wav", "por_collect.wav"]
+
+def source_files():
+    return ATLAS_SPRITES + list(IMAGES) + SOUNDS
+
+# Size and modification time of every source that exists, keyed by file name
+def source_signature(folder):
+    signature = {}
+    for name in source_files():
+        try:
+            stat = os.stat(os.path.join(folder, name))
+        except OSError:
+            continue
+        signature[name] = [stat.st_size, stat.st_mtime_ns]
+    return signature
+
+def mixer_format():
+    return list(mixer.get_init() or ())
+
+# Pixels of a surface as bytes, RGB when it is fully opaque and RGBA otherwise
+def pixel_data(surface):
+    if surface.get_flags() & pygame.SRCALPHA and pygame.surfarray.array_alpha(surface).min() < 255:
+        return "RGBA", pygame.image.tobytes(surface, "RGBA")
+    return "RGB", pygame.image.tobytes(surface, "RGB")
+
+# Place rects of the given sizes on shelves, tallest first. Returns the
+# position of every size, in order, and the atlas height.
+def pack_shelves(sizes, width, padding):
+    order = sorted(range(len(sizes)), key=lambda i: -sizes[i][1])
+    positions = [None] * len(sizes)
+    x = y = shelf_height = 0
+    for i in order:
+        w, h = sizes[i]
+        if x and x + w > width:
+            x, y, shelf_height = 0, y + shelf_height + padding, 0
+        positions[i] = (x, y)
+        x += w + padding
+        shelf_height = max(shelf_height, h)
+    return positions, y + shelf_height
+
+class PackWriter:
+    def __init__(self):
+        self.index = {}
+        self.blobs = []
+        self.offset = 0
+
+    def add_blob(self, data):
+        offset = self.offset
+        self.blobs.append(data)
+        self.offset += len(data)
+        return [offset, len(data)]
+
+    def add_surface(self, surface):
+        fmt, data = pixel_data(surface)
+        return {"size": list(surface.get_size()), "format": fmt, "data": self.add_blob(data)}
+
+    def write(self, path):
+        index = json.dumps(self.index).encode()
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, VERSION, len(index)))
+            f.write(index)
+            for blob in self.blobs:
+                f.write(blob)
+        os.replace(tmp_path, path)
+
+# Decode every source asset in the folder and write the pack. Missing or
+# broken sources are left out, so the game falls back for them as before.
+def build_pack(folder, path=None):
+    path = path or os.path.join(folder, PACK_NAME)
+    writer = PackWriter()
+    signature = source_signature(folder)
+    assets = {}
+
+    sprites = []
+    for name in ATLAS_SPRITES:
+        try:
+            if name in signature:
+                sprites.append((name, pygame.image.load(os.path.join(folder, name))))
+        except Exception as e:
+            print(f"Error packing {name}: {e}")
+    if sprites:
+        positions, height = pack_shelves([s.get_size() for _, s in sprites], ATLAS_WIDTH, ATLAS_PADDING)
+        atlas = pygame.Surface((ATLAS_WIDTH, max(height, 1)), pygame.SRCALPHA)
+        for (name, surface), position in zip(sprites, positions):
+            atlas.blit(surface, position)
+            assets[name] = {"type": "sprite", "rect": list(position) + list(surface.get_size())}
+        writer.index["atlas"] = writer.add_surface(atlas)
+
+    for name, size in IMAGES.items():
+        try:
+            if name in signature:
+                image = pygame.transform.scale(pygame.image.load(os.path.join(folder, name)), size)
+                assets[name] = dict(type="image", **writer.add_surface(image))
+        except Exception as e:
+            print(f"Error packing {name}: {e}")
+
+    if mixer.get_init():
+        for name in SOUNDS:
+            try:
+                if name in signature:
+                    raw = mixer.Sound(os.path.join(folder, name)).get_raw()
+                    assets[name] = {"type": "sound", "data": writer.add_blob(raw)}
+            except Exception as e:
+                print(f"Error packing {name}: {e}")
+
+    writer.index.update(sources=signature, mixer=mixer_format(), assets=assets)
+    writer.write(path)
+    print(f"Built asset pack {path} ({len(assets)} assets, {writer.offset // 1024} KB)")
+    return path
+
+# Read-only view of a built pack. Surfaces it returns share memory with the
+# mapping, so prepare them (which copies) before relying on them long term.
+class AssetPack:
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, index_length = HEADER.unpack_from(self.data)
+        if magic != MAGIC or version != VERSION:
+            self.data.close()
+            raise ValueError(f"{path} is not a version {VERSION} asset pack")
+        start = HEADER.size
+        self.index = json.loads(self.data[start:start + index_length])
+        self.base = start + index_length
+        self.view = memoryview(self.data)
+        self.assets = self.index["assets"]
+        self.atlas = self.surface(self.index["atlas"]) if "atlas" in self.index else None
+
+    def blob(self, entry):
+        offset, length = entry
+        return self.view[self.base + offset:self.base + offset + length]
+
+    def surface(self, entry):
+        return pygame.image.frombuffer(self.blob(entry["data"]), entry["size"], entry["format"])
+
+    def is_current(self, folder):
+        return self.index["sources"] == source_signature(folder) and self.index["mixer"] == mixer_format()
+
+    def __contains__(self, name):
+        return name in self.assets
+
+    # Surface for a sprite or image, or None if it is not in the pack
+    def image(self, name):
+        entry = self.assets.get(name)
+        if entry is None:
+            return None
+        if entry["type"] == "sprite":
+            return self.atlas.subsurface(entry["rect"])
+        return self.surface(entry)
+
+    def sound(self, name):
+        entry = self.assets.get(name)
+        return mixer.Sound(buffer=self.blob(entry["data"])) if entry else None
+
+    # Unmap the file. Nothing taken from the pack may be used after this.
+    def close(self):
+        self.atlas = None
+        self.view.release()
+        self.data.close()
+
+# Background rebuild started by load_pack, if any
+builder = None
+
+def _rebuild(folder, path):
+    try:
+        build_pack(folder, path)
+    except Exception as e:
+        print(f"Error building asset pack {path}: {e}")
+
+# Open the pack for the assets folder. Returns None if no pack can be used,
+# when it is missing, broken or any source changed; then, with rebuild, a new
+# one is built on a background thread for the next run, and this run loads
+# the sources directly rather than waiting for it.
+def load_pack(folder, rebuild=True):
+    global builder
+    if not os.path.isdir(folder):
+        return None
+    path = os.path.join(folder, PACK_NAME)
+    try:
+        if os.path.exists(path):
+            pack = AssetPack(path)
+            if pack.is_current(folder):
+                return pack
+            # The rebuild replaces the file, which Windows refuses while it
+            # is still mapped
+            pack.close()
+            print(f"Asset pack {path} is out of date, loading assets directly")
+        else:
+            print(f"No asset pack at {path}, loading assets directly")
+    except Exception as e:
+        print(f"Error loading asset pack {path}: {e}, loading assets directly")
+    if rebuild:
+        builder = threading.Thread(target=_rebuild, args=(folder, path), name="asset-pack", daemon=True)
+        builder.start()
+    return None
+
+# Wait for a background rebuild to finish writing, before pygame shuts down
+def wait_for_build():
+    if builder:
+        builder.join()
+
+# Build step: python assetpack.py [assets folder]
+if __name__ == "__main__":
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    pygame.init()
+    try:
+        mixer.init()
+    except Exception as e:
+        print(f"Error initializing mixer: {e}, sounds will not be packed")
+    build_pack(sys.argv[1] if len(sys.argv) > 1 else "assets")
@@ -0,0 +1,42 @@
+import numpy as np
+import pygame
+
+# One-time asset preparation. Every image is turned into the surface that will
+# actually be blitted, once, at load time:
+#   - it is scaled to its final render size, so nothing is rescaled per frame
+#   - fully opaque images are converted with convert(), so blits are plain copies
+#   - images whose alpha is only ever 0 or 255 become colorkeyed, RLE
+#     accelerated surfaces, so the transparent runs are skipped outright
+#   - only images with real partial transparency keep per-pixel alpha
+# The display mode must already be set, since conversion targets its format.
+
+# Colors tried, in order, as the colorkey for on/off transparency
+COLORKEY_CANDIDATES = [(255, 0, 255), (0, 255, 255), (1, 2, 3), (254, 1, 253)]
+
+def prepare_image(surface, size=None):
+    if size is not None and surface.get_size() != tuple(size):
+        surface = pygame.transform.scale(surface, size)
+    if not surface.get_flags() & pygame.SRCALPHA:
+        return surface.convert(), "opaque"
+
+    surface = surface.convert_alpha()
+    alpha = pygame.surfarray.array_alpha(surface)
+    if alpha.min() == 255:
+        return surface.convert(), "opaque"
+    if not np.all((alpha == 0) | (alpha == 255)):
+        return surface, "alpha"
+
+    rgb = pygame.surfarray.array3d(surface)
+    packed = (rgb[..., 0].astype(np.int32) << 16) | (rgb[..., 1].astype(np.int32) << 8) | rgb[..., 2]
+    used = np.unique(packed[alpha == 255])
+    for key in COLORKEY_CANDIDATES:
+        packed_key = (key[0] << 16) | (key[1] << 8) | key[2]
+        if packed_key in used:
+            continue
+        keyed = surface.convert()
+        pixels = pygame.surfarray.pixels3d(keyed)
+        pixels[alpha == 0] = key
+        del pixels
+        keyed.set_colorkey(key, pygame.RLEACCEL)
+        return keyed, "colorkey"
+    return surface, "alpha"
@@ -0,0 +1,85 @@
+import time
+from pygame import mixer
+
+# Sound effect playback with reserved channel groups. Every category of sound
+# gets its own mixer channels, reserved so Sound.play() and other categories
+# can never take them: rapid fire can use up the "fire" channels but never
+# cuts off a hit, a penalty or the narration. Within a group a new sound takes
+# a free channel, or steals the one that started longest ago. Sounds with a
+# minimum interval are dropped when played again sooner than that, so a burst
+# of triple shots in one frame is one shot sound, not three stacked ones.
+#
+# Playing a sound only picks a channel and starts it, so it is cheap enough to
+# do straight from the frame loop; decoding happens at load time.
+
+# Category: (channels, minimum seconds between plays of the same sound)
+CATEGORIES = {
+    "fire": (4, 0.04),
+    "impact": (4, 0.0),
+    "alert": (2, 0.0),
+    "voice": (1, 0.0),
+}
+
+class ChannelGroup:
+    def __init__(self, channels, min_interval):
+        self.channels = channels
+        self.min_interval = min_interval
+        self.started = [0.0] * len(channels)
+
+    # A free channel, or the one playing the oldest sound
+    def pick(self):
+        for i, channel in enumerate(self.channels):
+            if not channel.get_busy():
+                return i, False
+        return self.started.index(min(self.started)), True
+
+class AudioManager:
+    def __init__(self, categories=CATEGORIES, free_channels=4):
+        reserved = sum(count for count, _ in categories.values())
+        mixer.set_num_channels(reserved + free_channels)
+        mixer.set_reserved(reserved)
+        self.groups = {}
+        first = 0
+        for name, (count, min_interval) in categories.items():
+            channels = [mixer.Channel(first + i) for i in range(count)]
+            self.groups[name] = ChannelGroup(channels, min_interval)
+            first += count
+        self.sounds = {}
+        self.last_played = {}
+        self.played = 0
+        self.limited = 0
+        self.stolen = 0
+
+    def add(self, name, sound, category):
+        self.sounds[name] = (sound, self.groups[category])
+
+    def has(self, name):
+        return name in self.sounds
+
+    # Play a sound by name. Returns its channel, or None if the sound is not
+    # loaded or was rate limited.
+    def play(self, name, volume=1.0):
+        entry = self.sounds.get(name)
+        if entry is None:
+            return None
+        sound, group = entry
+        now = time.perf_counter()
+        if group.min_interval and now - self.last_played.get(name, -group.min_interval) < group.min_interval:
+            self.limited += 1
+            return None
+        self.last_played[name] = now
+        i, stolen = group.pick()
+        channel = group.channels[i]
+        channel.play(sound)
+        channel.set_volume(volume)
+        group.started[i] = now
+        self.played += 1
+        self.stolen += stolen
+        return channel
+
+    def stop(self, category):
+        for channel in self.groups[category].channels:
+            channel.stop()
+
+    def report(self):
+        return f"Audio: {self.played} sounds played, {self.limited} rate limited, {self.stolen} voices stolen"
@@ -0,0 +1,123 @@
+import argparse
+import json
+import os
+import platform
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from entities import ENEMY, SUPERSEED, LOANSHARK, POR
+from game import DEFAULT_TUNING, POLICIES, TICK_RATE, GameState, simulate
+from perf import git_revision
+
+# Monte Carlo balancing runner. Plays many headless games with the bot
+# policies from game.py, spread over a process pool, and summarizes how long
+# paying off the debt takes, how many shots it needs and what spawned along
+# the way. Games run through the same GameState and step() as the real game,
+# so a tuning change measured here is the change players get. Balance knobs
+# (see game.Tuning) can be overridden per run to compare settings.
+#
+# Usage: python balance.py [--games N] [--policy NAME ...] [--set KNOB=VALUE ...]
+#                          [--workers N] [--max-minutes M] [--output FILE]
+
+SPAWN_KINDS = {"enemy": ENEMY, "superseed": SUPERSEED, "loanshark": LOANSHARK, "por": POR}
+
+# One game in a worker process. Takes and returns plain data so it pickles.
+def run_game(job):
+    policy, seed, max_frames, tuning = job
+    state = GameState(seed, tuning=DEFAULT_TUNING._replace(**tuning))
+    simulate(POLICIES[policy], seed, max_frames, state)
+    return {
+        "policy": policy,
+        "seed": seed,
+        "finished": state.game_over,
+        "game_time": state.game_time,
+        "frames": state.frame,
+        "shots_fired": state.shots_fired,
+        "spawned": {name: state.spawned[kind] for name, kind in SPAWN_KINDS.items()},
+        "debt": state.debt,
+    }
+
+def distribution(values):
+    if not values:
+        return None
+    values = np.array(values, dtype=float)
+    stats = {f"p{p}": round(float(np.percentile(values, p)), 2) for p in (10, 50, 90)}
+    stats.update(mean=round(float(values.mean()), 2), min=round(float(values.min()), 2),
+                 max=round(float(values.max()), 2))
+    return stats
+
+def summarize(games):
+    finished = [game for game in games if game["finished"]]
+    return {
+        "games": len(games),
+        "finished": len(finished),
+        "time_to_zero_debt": distribution([game["game_time"] for game in finished]),
+        "shots_fired": distribution([game["shots_fired"] for game in finished]),
+        "spawned": {name: distribution([game["spawned"][name] for game in finished]) for name in SPAWN_KINDS},
+        "unfinished_debt": distribution([game["debt"] for game in games if not game["finished"]]),
+    }
+
+def parse_knob(text):
+    name, _, value = text.partition("=")
+    if name not in DEFAULT_TUNING._fields:
+        raise argparse.ArgumentTypeError(f"unknown knob {name}, expected one of {', '.join(DEFAULT_TUNING._fields)}")
+    return name, float(value)
+
+def run_balance(argv=None):
+    parser = argparse.ArgumentParser(description="Monte Carlo balancing runner for Debt Blaster")
+    parser.add_argument("--games", type=int, default=1000, help="games per policy")
+    parser.add_argument("--policy", action="append", choices=sorted(POLICIES),
+                        help="bot policy to run (repeatable, default: chase)")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first game")
+    parser.add_argument("--set", dest="knobs", action="append", type=parse_knob, default=[],
+                        metavar="KNOB=VALUE", help="override a balance knob (repeatable)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--max-minutes", type=float, default=60, help="give up on a game after this much game time")
+    parser.add_argument("--output", default="balance_results.json")
+    parser.add_argument("--keep-games", action="store_true", help="include every game's result in the output")
+    args = parser.parse_args(argv)
+
+    tuning = dict(args.knobs)
+    policies = args.policy or ["chase"]
+    max_frames = int(args.max_minutes * 60 * TICK_RATE)
+    jobs = [(policy, args.seed + i, max_frames, tuning) for policy in policies for i in range(args.games)]
+    print(f"Running {len(jobs)} games on {args.workers} workers")
+
+    start = time.perf_counter()
+    games = []
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        for game in pool.map(run_game, jobs, chunksize=max(1, len(jobs) // (args.workers * 8))):
+            games.append(game)
+            if len(games) % max(1, len(jobs) // 10) == 0:
+                print(f"  {len(games)}/{len(jobs)} games after {time.perf_counter() - start:.0f}s")
+    elapsed = time.perf_counter() - start
+
+    results = {
+        "environment": {"commit": git_revision(), "python": platform.python_version(),
+                        "platform": platform.platform(), "workers": args.workers},
+        "tuning": DEFAULT_TUNING._replace(**tuning)._asdict(),
+        "max_minutes": args.max_minutes,
+        "seconds": round(elapsed, 1),
+        "policies": {policy: summarize([game for game in games if game["policy"] == policy])
+                     for policy in policies},
+    }
+    if args.keep_games:
+        results["games"] = games
+
+    for policy, summary in results["policies"].items():
+        print(f"{policy}: {summary['finished']}/{summary['games']} games paid off the debt")
+        times = summary["time_to_zero_debt"]
+        if times:
+            print(f"  time to zero debt  p10 {times['p10']:.0f}s  p50 {times['p50']:.0f}s  p90 {times['p90']:.0f}s")
+            print(f"  shots fired        p50 {summary['shots_fired']['p50']:.0f}")
+            print("  spawned (mean)     " + "  ".join(f"{name} {stats['mean']:.0f}"
+                                                   for name, stats in summary["spawned"].items()))
+    frames = sum(game["frames"] for game in games)
+    print(f"{frames} frames in {elapsed:.1f}s ({frames / elapsed:.0f} frames/s)")
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+
+if __name__ == "__main__":
+    run_balance()
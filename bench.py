@@ -0,0 +1,214 @@
+import argparse
+import json
+import os
+import platform
+
+# Frame-phase benchmark. Drives the real game loop pieces (event pump, step(),
+# draw_game() and present()) from scripted scenarios and reports where
+# each frame's time goes as percentiles per phase, along with garbage
+# collector activity (allocations per frame, collections and pauses). Runs
+# headless through SDL's dummy drivers unless told otherwise, and writes the
+# results as JSON so runs from different commits can be compared with
+# --compare. Given more than one --renderer, every scenario runs with each of
+# them and the frame times are printed side by side.
+#
+# Usage: python bench.py [--frames N] [--scenario NAME ...] [--renderer MODE ...]
+#                        [--output FILE] [--compare OLD_FILE]
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import pygame
+import main
+from game import Inputs, NO_INPUT, POR_DURATION, STARTING_DEBT, WIDTH, HEIGHT, keep_swarm, step, ticks
+from perf import FrameTimer, GcMonitor, git_revision
+
+PHASES = ("events", "movement", "collisions", "particles", "draw", "text", "flip", "frame")
+
+# Scenario scripts. Each one is called before every frame with the state and
+# the frame number and returns that frame's Inputs; a script may also poke the
+# state directly to set up its stress condition.
+def idle(state, frame):
+    return NO_INPUT
+
+# Sweep back and forth across the screen, firing ten shots a second
+def sustained_fire(state, frame):
+    left = (frame // 120) % 2 == 1
+    return Inputs(left, not left, 1 if frame % 6 == 0 else 0)
+
+# Keep the POR triple shot active and fire every other frame
+def por_storm(state, frame):
+    state.por_active = True
+    state.por_until = state.frame + ticks(POR_DURATION)
+    inputs = sustained_fire(state, frame)
+    return inputs._replace(fire=frame % 2)
+
+# Keep a fixed number of moneybags and loan sharks falling (one shark for every
+# four moneybags) while firing as in sustained_fire
+def swarm(count):
+    def scenario(state, frame):
+        keep_swarm(state, count)
+        return sustained_fire(state, frame)
+    return scenario
+
+# A swarm of 200 under sustained fire, with a burst of every effect on top
+# each frame to hold the particle system at its cap
+def particle_storm(state, frame):
+    rng = state.rng
+    for name in ("hit", "powerup", "penalty", "por"):
+        main.particles.burst(name, rng.uniform(0, WIDTH), rng.uniform(0, HEIGHT))
+    return storm_swarm(state, frame)
+
+storm_swarm = swarm(200)
+
+SCENARIOS = {
+    "idle": idle,
+    "sustained_fire": sustained_fire,
+    "por_storm": por_storm,
+    "swarm_1k": swarm(1000),
+    "swarm_5k": swarm(5000),
+    "particle_storm": particle_storm,
+}
+
+def run_scenario(script, frames, seed, renderer):
+    main.use_renderer(renderer)
+    state = main.state
+    state.rng.seed(seed)
+    state.reset()
+    main.text_cache.clear()
+    main.text_cache.hits = main.text_cache.misses = 0
+    particles = main.particles
+    particles.clear()
+    particles.limit = particles.capacity
+    spawned, dropped = particles.spawned, particles.dropped
+    timer = FrameTimer()
+    gc_monitor = GcMonitor()
+    space = pygame.event.Event(pygame.KEYDOWN, key=pygame.K_SPACE, unicode=" ")
+    live = 0
+    live_particles = 0
+    gc_monitor.start()
+    for frame in range(frames):
+        inputs = script(state, frame)
+        # Stress runs should never end because the debt got paid off
+        if state.debt < STARTING_DEBT // 2:
+            state.debt = STARTING_DEBT
+        for _ in range(inputs.fire):
+            pygame.event.post(space)
+
+        timer.begin_frame()
+        fire = 0
+        for event in pygame.event.get():
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_SPACE:
+                fire += 1
+        timer.lap("events")
+        step(state, inputs._replace(fire=fire), timer)
+        main.update_particles(state)
+        timer.lap("particles")
+        main.present(main.draw_game(state, timer))
+        timer.lap("flip")
+        timer.end_frame()
+        live += state.entities.count
+        live_particles += particles.count
+    gc_monitor.stop()
+
+    phases = timer.summary()
+    return {
+        "frames": frames,
+        "mean_live_entities": round(live / frames, 1),
+        "particles": {"mean_live": round(live_particles / frames, 1), "spawned": particles.spawned - spawned,
+                      "dropped": particles.dropped - dropped, "limit": particles.limit},
+        "text_cache": {"hits": main.text_cache.hits, "misses": main.text_cache.misses},
+        "gc": gc_monitor.summary(frames),
+        "phases": {phase: phases[phase] for phase in PHASES if phase in phases},
+    }
+
+def environment():
+    return {
+        "commit": git_revision(),
+        "python": platform.python_version(),
+        "pygame": pygame.version.ver,
+        "sdl": ".".join(map(str, pygame.get_sdl_version())),
+        "platform": platform.platform(),
+        "video_driver": pygame.display.get_driver(),
+    }
+
+def print_result(name, result):
+    gc_stats = result["gc"]
+    print(f"{name} ({result['mean_live_entities']} live entities on average, "
+          f"{gc_stats['allocations_per_frame']} GC allocations per frame, "
+          f"{sum(gc_stats['collections'])} collections taking {gc_stats['pause_total_ms']:.2f} ms)")
+    for phase, stats in result["phases"].items():
+        print(f"  {phase:<11} p50 {stats['p50']:8.3f} ms  p90 {stats['p90']:8.3f} ms  "
+              f"p99 {stats['p99']:8.3f} ms  max {stats['max']:8.3f} ms")
+
+# Print the frame time of every scenario under each renderer
+def compare_renderers(results, renderers):
+    print("\nFrame time by renderer (p50 / p99 ms):")
+    print(f"  {'':<15}" + "".join(f"{renderer:>20}" for renderer in renderers))
+    for name, by_renderer in results.items():
+        cells = []
+        for renderer in renderers:
+            frame = by_renderer[renderer]["phases"]["frame"]
+            cells.append(f"{frame['p50']:.3f} / {frame['p99']:.3f}")
+        print(f"  {name:<15}" + "".join(f"{cell:>20}" for cell in cells))
+
+# Print how the p50 and p99 of every phase moved against an older result file
+def compare(old, new):
+    print(f"\nCompared with {old['environment'].get('commit')}:")
+    for name, result in new["scenarios"].items():
+        old_result = old["scenarios"].get(name)
+        if not old_result:
+            continue
+        print(f"  {name}")
+        for phase, stats in result["phases"].items():
+            old_stats = old_result["phases"].get(phase)
+            if not old_stats:
+                continue
+            changes = []
+            for key in ("p50", "p99"):
+                before, after = old_stats[key], stats[key]
+                change = (after - before) / before * 100 if before else 0.0
+                changes.append(f"{key} {before:.3f} -> {after:.3f} ms ({change:+.0f}%)")
+            print(f"    {phase:<11} " + ", ".join(changes))
+
+def run_benchmarks(argv=None):
+    parser = argparse.ArgumentParser(description="Frame-phase benchmark for Debt Blaster")
+    parser.add_argument("--frames", type=int, default=600)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS),
+                        help="scenario to run (repeatable, default: all)")
+    parser.add_argument("--renderer", action="append", choices=main.RENDERERS,
+                        help="renderer to run with (repeatable, default: full)")
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--compare", help="earlier result file to compare against")
+    args = parser.parse_args(argv)
+
+    # The texture renderer switches the window to SCALED mode for good, so the
+    # surface renderers run first on the plain window they normally get
+    renderers = sorted(dict.fromkeys(args.renderer or ["full"]), key=lambda renderer: renderer == "texture")
+    main.finish_loading()
+    results = {"environment": environment(), "renderers": renderers,
+               "startup": {name: round(ms, 1) for name, ms in main.startup_timings.items()},
+               "scenarios": {}}
+    by_renderer = {}
+    for renderer in renderers:
+        for name in args.scenario or SCENARIOS:
+            result = run_scenario(SCENARIOS[name], args.frames, args.seed, renderer)
+            by_renderer.setdefault(name, {})[renderer] = result
+            # Scenario names stay as they were for a single renderer, so older
+            # result files still compare
+            key = name if len(renderers) == 1 else f"{name}/{renderer}"
+            results["scenarios"][key] = result
+            print_result(key, result)
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if len(renderers) > 1:
+        compare_renderers(by_renderer, renderers)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), results)
+
+if __name__ == "__main__":
+    run_benchmarks()
@@ -0,0 +1,131 @@
+import sys
+import time
+import numpy as np
+
+# Uniform-grid broadphase over arrays of boxes. The "b" boxes are bucketed by
+# the grid cell holding their top-left corner (a stable sort on the cell key,
+# which numpy does as a radix sort for small integer keys), and every "a" box
+# looks up the handful of cells that could hold an overlapping "b" box with a
+# binary search. Only the candidate pairs found that way get the exact AABB
+# test, so the cost grows with the number of near misses rather than with
+# len(a) * len(b).
+#
+# Coordinates are truncated toward zero first, the same way pygame.Rect does,
+# so the results match Rect.colliderect. Cells smaller than the boxes are
+# fine: an "a" box just looks further up and left for "b" corners.
+def overlapping_pairs(ax, ay, aw, ah, bx, by, bw, bh, cell_size=16):
+    empty = np.empty(0, dtype=np.intp)
+    if not len(ax) or not len(bx):
+        return empty, empty
+    if len(ax) * len(bx) <= 4096:
+        return _all_pairs(ax, ay, aw, ah, bx, by, bw, bh)
+    ax = np.trunc(ax).astype(np.int64)
+    ay = np.trunc(ay).astype(np.int64)
+    bx = np.trunc(bx).astype(np.int64)
+    by = np.trunc(by).astype(np.int64)
+
+    bcx = bx // cell_size
+    bcy = by // cell_size
+    min_cx, min_cy = bcx.min(), bcy.min()
+    columns = int(bcx.max() - min_cx) + 1
+    rows = int(bcy.max() - min_cy) + 1
+    keys = (bcy - min_cy) * columns + (bcx - min_cx)
+    key_dtype = np.int16 if columns * rows < 2 ** 15 else np.int64
+    order = np.argsort(keys.astype(key_dtype), kind="stable")
+    sorted_keys = keys[order]
+
+    # A "b" box overlapping an "a" box starts at most reach_x/reach_y cells
+    # up/left of the cell holding the corner of the "a" box
+    acx = ax // cell_size
+    acy = ay // cell_size
+    reach_x = -(-int(bw.max()) // cell_size)
+    reach_y = -(-int(bh.max()) // cell_size)
+    span_x = int(((ax + aw - 1) // cell_size - acx).max()) + 1
+    span_y = int(((ay + ah - 1) // cell_size - acy).max()) + 1
+    dx = np.arange(-reach_x, span_x)
+    dy = np.arange(-reach_y, span_y)
+    cx = (acx - min_cx)[:, None, None] + dx[None, None, :]
+    cy = (acy - min_cy)[:, None, None] + dy[None, :, None]
+    valid = (cx >= 0) & (cx < columns) & (cy >= 0) & (cy < rows)
+    query_keys = (cy * columns + cx)[valid]
+    query_a = np.nonzero(valid)[0]
+
+    starts = np.searchsorted(sorted_keys, query_keys, side="left")
+    counts = np.searchsorted(sorted_keys, query_keys, side="right") - starts
+    total = int(counts.sum())
+    if not total:
+        return empty, empty
+    first = np.repeat(starts - (np.cumsum(counts) - counts), counts)
+    i = np.repeat(query_a, counts)
+    j = order[first + np.arange(total)]
+
+    overlap = ((ax[i] < bx[j] + bw[j]) & (bx[j] < ax[i] + aw[i]) &
+               (ay[i] < by[j] + bh[j]) & (by[j] < ay[i] + ah[i]))
+    return i[overlap], j[overlap]
+
+# Plain all-pairs test, cheaper than setting up the grid for a few boxes
+def _all_pairs(ax, ay, aw, ah, bx, by, bw, bh):
+    ax, ay = np.trunc(ax)[:, None], np.trunc(ay)[:, None]
+    bx, by = np.trunc(bx)[None, :], np.trunc(by)[None, :]
+    overlap = ((ax < bx + bw) & (bx < ax + aw[:, None]) &
+               (ay < by + bh) & (by < ay + ah[:, None]))
+    return np.nonzero(overlap)
+
+# Stress run for a volley of bullets over a growing field of falling sprites.
+# For each entity count it times an all-pairs overlap test against the grid
+# broadphase, checks the grid finds the same pairs as testing every bullet
+# Rect against every sprite Rect, and times whole game steps with that many
+# moneybags and loan sharks falling under POR triple fire.
+# Usage: python broadphase.py [bullets]
+def _stress(bullet_count=90, frames=60, cell_size=16):
+    import pygame
+    from game import GameState, Inputs, STARTING_DEBT, keep_swarm, step
+
+    rng = np.random.default_rng(1234)
+    print(f"{'entities':>8} {'all-pairs ms':>13} {'grid ms':>9} {'pairs':>6} {'step ms':>8}")
+    for entity_count in (100, 1000, 2000, 5000, 10000, 20000):
+        bx = rng.uniform(0, 760, entity_count)
+        by = rng.uniform(-40, 600, entity_count)
+        bw = np.full(entity_count, 40)
+        bh = np.full(entity_count, 40)
+        ax = rng.uniform(0, 795, bullet_count)
+        ay = rng.uniform(0, 590, bullet_count)
+        aw = np.full(bullet_count, 5)
+        ah = np.full(bullet_count, 10)
+
+        start = time.perf_counter()
+        for _ in range(frames):
+            naive = _all_pairs(ax, ay, aw, ah, bx, by, bw, bh)
+        naive_ms = (time.perf_counter() - start) * 1000 / frames
+
+        start = time.perf_counter()
+        for _ in range(frames):
+            grid = overlapping_pairs(ax, ay, aw, ah, bx, by, bw, bh, cell_size)
+        grid_ms = (time.perf_counter() - start) * 1000 / frames
+
+        rects = [pygame.Rect(x, y, w, h) for x, y, w, h in zip(bx, by, bw, bh)]
+        brute = {(i, j) for i, bullet in enumerate(zip(ax, ay, aw, ah))
+                 for j in pygame.Rect(bullet).collidelistall(rects)}
+        for pairs in (naive, grid):
+            if set(zip(*map(np.ndarray.tolist, pairs))) != brute:
+                print(f"Pair mismatch at {entity_count} entities")
+                sys.exit(1)
+
+        # A second of play fills the screen with bullets before the timing
+        # starts; the debt is held up so the game never ends
+        state = GameState(seed=1234)
+        state.por_active = True
+        state.por_until = float("inf")
+        step_time = 0.0
+        for frame in range(60 + frames):
+            keep_swarm(state, entity_count)
+            state.debt = STARTING_DEBT
+            start = time.perf_counter()
+            step(state, Inputs(False, False, frame % 2))
+            if frame >= 60:
+                step_time += time.perf_counter() - start
+        step_ms = step_time * 1000 / frames
+        print(f"{entity_count:>8} {naive_ms:>13.3f} {grid_ms:>9.3f} {len(grid[0]):>6} {step_ms:>8.3f}")
+
+if __name__ == "__main__":
+    _stress(*(int(arg) for arg in sys.argv[1:2]))
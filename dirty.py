@@ -0,0 +1,76 @@
+import pygame
+
+# Dirty-rectangle renderer for the gameplay screen. Instead of redrawing the
+# whole background and flipping all 800x600 pixels every frame, it remembers
+# where sprites and HUD text were drawn last frame, restores just those areas
+# from the background, draws this frame's sprites with batched Surface.blits()
+# calls and returns the union of old and new rects for
+# pygame.display.update(rects). On software-rendered targets, where full-screen
+# blits dominate the frame, this only touches the pixels that changed.
+#
+# Blit sequences are passed as generators rather than lists, so a swarm of
+# thousands of sprites does not build thousands of short-lived tuples at once
+# (each batch of 700 would otherwise set off a garbage collection).
+#
+# When so many rects are dirty that per-rect work would cost more than a full
+# redraw (huge swarms), it falls back to a full redraw for that frame.
+class DirtyRenderer:
+    def __init__(self, screen, background=None, fill_color=(0, 0, 0), max_rects=400):
+        self.screen = screen
+        self.fill_color = fill_color
+        self.max_rects = max_rects
+        self.previous = []
+        self.full_redraw = True
+        self.set_background(background)
+
+    def set_background(self, background):
+        self.background = background
+        self.background_opaque = (background is not None and not background.get_flags() & pygame.SRCALPHA
+                                  and background.get_colorkey() is None)
+        self.invalidate()
+
+    # Redraw everything next frame, e.g. after a menu screen drew over the game
+    def invalidate(self):
+        self.full_redraw = True
+
+    def _restore(self, rects):
+        screen = self.screen
+        if not self.background_opaque:
+            for rect in rects:
+                screen.fill(self.fill_color, rect)
+        if self.background is not None:
+            background = self.background
+            screen.blits(((background, rect, rect) for rect in rects), doreturn=False)
+
+    # Draw one frame. batches are (surface, fallback color, size, positions) in
+    # draw order, with surface None for a plain rectangle; effects, if given,
+    # is called with the screen to draw over the sprites and returns the rect it
+    # drew over (or None); texts are (surface, position) pairs drawn on top.
+    # Returns the rects to pass to pygame.display.update().
+    def draw(self, batches, texts, timer, effects=None):
+        screen = self.screen
+        full = self.full_redraw or len(self.previous) > self.max_rects
+        if full:
+            self._restore([screen.get_rect()])
+        else:
+            self._restore(self.previous)
+
+        drawn = []
+        for surface, color, size, positions in batches:
+            if surface is not None:
+                drawn.extend(screen.blits((surface, position) for position in positions))
+            else:
+                for position in positions:
+                    drawn.append(pygame.draw.rect(screen, color, (position, size)))
+        if effects:
+            rect = effects(screen)
+            if rect:
+                drawn.append(rect)
+        timer.lap("draw")
+        drawn.extend(screen.blits(texts))
+        timer.lap("text")
+
+        dirty = [screen.get_rect()] if full or len(drawn) > self.max_rects else self.previous + drawn
+        self.previous = drawn
+        self.full_redraw = False
+        return dirty
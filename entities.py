@@ -0,0 +1,174 @@
+import numpy as np
+from broadphase import overlapping_pairs
+
+# Entity kinds. The target kinds are numbered in collision priority order: a
+# bullet touching several things hits the lowest kind first.
+BULLET = 0
+ENEMY = 1
+SUPERSEED = 2
+LOANSHARK = 3
+POR = 4
+KIND_COUNT = 5
+
+# Struct-of-arrays store for every bullet, moneybag, superseed, loan shark and
+# POR in play. Each column is a NumPy array and rows [0, count) are live, so
+# movement, off-screen culling and the bullet overlap test each run as one
+# vectorized pass. Dead rows are flagged in the alive mask and then filled by
+# swap-compaction (moving rows from the tail into the holes), so removal never
+# shifts the whole store the way list.remove did.
+#
+# Compaction reorders rows, so every row also carries a spawn serial; that is
+# what keeps collision resolution in spawn order like the old per-kind lists.
+#
+# The store is also the entity pool: a spawn writes into the first free row,
+# culled and hit rows are reused once compacted, and the arrays only ever
+# grow, so steady play creates no Python object per bullet or spawn.
+class EntityStore:
+    def __init__(self, sizes, capacity=256):
+        # sizes is a (width, height) pair per kind, indexed by kind
+        self.widths = np.array([size[0] for size in sizes], dtype=np.int64)
+        self.heights = np.array([size[1] for size in sizes], dtype=np.int64)
+        self.count = 0
+        self.next_serial = 0
+        self._allocate(capacity)
+
+    def _allocate(self, capacity):
+        self.x = np.zeros(capacity)
+        self.y = np.zeros(capacity)
+        self.vx = np.zeros(capacity)
+        self.vy = np.zeros(capacity)
+        self.kind = np.zeros(capacity, dtype=np.int8)
+        self.serial = np.zeros(capacity, dtype=np.int64)
+        self.alive = np.zeros(capacity, dtype=bool)
+
+    def _columns(self):
+        return (self.x, self.y, self.vx, self.vy, self.kind, self.serial, self.alive)
+
+    def _grow(self):
+        old = self._columns()
+        self._allocate(len(self.x) * 2)
+        for new_column, old_column in zip(self._columns(), old):
+            new_column[:self.count] = old_column[:self.count]
+
+    def clear(self):
+        self.count = 0
+        self.next_serial = 0
+
+    def spawn(self, kind, x, y, vx, vy):
+        if self.count == len(self.x):
+            self._grow()
+        i = self.count
+        self.x[i] = x
+        self.y[i] = y
+        self.vx[i] = vx
+        self.vy[i] = vy
+        self.kind[i] = kind
+        self.serial[i] = self.next_serial
+        self.alive[i] = True
+        self.next_serial += 1
+        self.count += 1
+
+    def move(self):
+        n = self.count
+        self.x[:n] += self.vx[:n]
+        self.y[:n] += self.vy[:n]
+
+    # Flag bullets that left the top or sides and targets that fell off the
+    # bottom of a width x height playfield
+    def cull(self, width, height):
+        n = self.count
+        x = self.x[:n]
+        y = self.y[:n]
+        bullets = self.kind[:n] == BULLET
+        gone = np.where(bullets,
+                        (y < -self.heights[BULLET]) | (x < 0) | (x > width),
+                        y > height)
+        self.alive[:n] &= ~gone
+
+    # Resolve this frame's bullet hits. Each bullet is consumed by its first
+    # hit, and bullets are resolved in the order they were fired, checking
+    # enemies, superseeds, loan sharks and then PORs and, within a kind, the
+    # oldest entity first. Hit rows are flagged dead. Returns a (kind, x, y)
+    # tuple per hit, in resolution order, with x, y the center of what was hit.
+    def collide(self):
+        n = self.count
+        kind = self.kind[:n]
+        alive = self.alive[:n]
+        bullets = np.flatnonzero(alive & (kind == BULLET))
+        targets = np.flatnonzero(alive & (kind != BULLET))
+        if not len(bullets) or not len(targets):
+            return []
+        bullet_kinds = kind[bullets]
+        target_kinds = kind[targets]
+        i, j = overlapping_pairs(self.x[bullets], self.y[bullets],
+                                 self.widths[bullet_kinds], self.heights[bullet_kinds],
+                                 self.x[targets], self.y[targets],
+                                 self.widths[target_kinds], self.heights[target_kinds])
+        if not len(i):
+            return []
+        bullet_rows = bullets[i]
+        target_rows = targets[j]
+        order = np.lexsort((self.serial[target_rows], kind[target_rows], self.serial[bullet_rows]))
+
+        hits = []
+        spent = set()
+        taken = set()
+        for bullet, target in zip(bullet_rows[order].tolist(), target_rows[order].tolist()):
+            if bullet in spent or target in taken:
+                continue
+            spent.add(bullet)
+            taken.add(target)
+            target_kind = int(kind[target])
+            hits.append((target_kind, float(self.x[target] + self.widths[target_kind] / 2),
+                         float(self.y[target] + self.heights[target_kind] / 2)))
+        self.alive[list(spent)] = False
+        self.alive[list(taken)] = False
+        return hits
+
+    # Swap-compact dead rows out of [0, count)
+    def compact(self):
+        n = self.count
+        alive = self.alive[:n]
+        live = int(np.count_nonzero(alive))
+        if live == n:
+            return
+        holes = np.flatnonzero(~alive[:live])
+        movers = np.flatnonzero(alive[live:]) + live
+        for column in self._columns():
+            column[holes] = column[movers]
+        self.count = live
+
+    # Replace every entity with the given kinds and positions, standing still.
+    # A network client mirrors the server's entities into its store this way.
+    def assign(self, kind, x, y):
+        while len(self.x) < len(kind):
+            self._grow()
+        n = self.count = len(kind)
+        self.kind[:n] = kind
+        self.x[:n] = x
+        self.y[:n] = y
+        self.vx[:n] = 0.0
+        self.vy[:n] = 0.0
+        self.serial[:n] = np.arange(self.next_serial, self.next_serial + n)
+        self.alive[:n] = True
+        self.next_serial += n
+
+    def rows(self, kind):
+        return np.flatnonzero(self.kind[:self.count] == kind)
+
+    def count_of(self, kind):
+        return int(np.count_nonzero(self.kind[:self.count] == kind))
+
+    # Live entities of every kind, indexed by kind
+    def counts(self):
+        return np.bincount(self.kind[:self.count], minlength=KIND_COUNT).tolist()
+
+    # Positions of every live entity of a kind, as plain floats for blitting.
+    # alpha below 1 interpolates back towards where each entity was one move
+    # earlier, for drawing in between simulation steps.
+    def positions(self, kind, alpha=1.0):
+        rows = self.rows(kind)
+        if alpha >= 1.0:
+            return zip(self.x[rows].tolist(), self.y[rows].tolist())
+        back = 1.0 - alpha
+        return zip((self.x[rows] - self.vx[rows] * back).tolist(), (self.y[rows] - self.vy[rows] * back).tolist())
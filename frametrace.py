@@ -0,0 +1,61 @@
+import json
+import queue
+import threading
+import time
+
+# Per-frame trace recorder. Every frame becomes one JSON line with the phase
+# timings in milliseconds, the live entity counts and the game events of that
+# frame, so a hitch in a session can be lined up with what was on screen and
+# what had just happened (a POR pickup, a difficulty step):
+#
+#   {"f": 812, "t": 13.52, "ms": {"frame": 2.1, ...}, "n": [3, 6, 0, 1, 0, 0], "e": ["por"]}
+#
+# n holds the live bullets, enemies, superseeds, loan sharks, PORs and
+# notifications, in that order. Lines are written by a background thread.
+# The queue between the game and the writer is bounded: if the disk cannot
+# keep up, frames are dropped rather than stalling the game or growing
+# memory, and the number dropped is written as {"dropped": n} once there is
+# room again.
+class TraceRecorder:
+    def __init__(self, path, max_pending=1024):
+        self.path = path
+        self.file = open(path, "w")
+        self.pending = queue.Queue(maxsize=max_pending)
+        self.dropped = 0
+        self.frames = 0
+        self.start = time.perf_counter()
+        self.writer = threading.Thread(target=self._write, name="trace-writer", daemon=True)
+        self.writer.start()
+        print(f"Recording frame trace to {path}")
+
+    def record(self, timings, counts, events=()):
+        record = {
+            "f": self.frames,
+            "t": round(time.perf_counter() - self.start, 4),
+            "ms": {phase: round(seconds * 1000, 3) for phase, seconds in timings.items()},
+            "n": counts,
+        }
+        if events:
+            record["e"] = list(events)
+        self.frames += 1
+        try:
+            if self.dropped:
+                self.pending.put_nowait({"dropped": self.dropped})
+                self.dropped = 0
+            self.pending.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def _write(self):
+        while True:
+            record = self.pending.get()
+            if record is None:
+                break
+            self.file.write(json.dumps(record, separators=(",", ":")) + "\n")
+        self.file.close()
+
+    # Write out everything still queued and close the file
+    def close(self):
+        self.pending.put(None)
+        self.writer.join()
+        print(f"Frame trace written to {self.path} ({self.frames} frames)")
@@ -0,0 +1,364 @@
+import math
+import random
+import sys
+import time
+from collections import namedtuple
+from entities import EntityStore, BULLET, ENEMY, SUPERSEED, LOANSHARK, POR
+from perf import NULL_TIMER
+
+# Headless game simulation. Everything that decides how a run plays out lives
+# here: the player, the entity store, spawning, collisions, debt and the
+# difficulty steps. Nothing in this module touches pygame, so a run can be
+# stepped without a window, as fast as the CPU allows, and two runs with the
+# same seed and inputs play out identically. main.py draws the state and turns
+# the events returned by step() into sounds.
+
+WIDTH = 800
+HEIGHT = 600
+
+# The simulation advances in fixed steps of STEP seconds, however fast frames
+# are drawn. Speeds below are in pixels per second and durations in seconds;
+# per-step amounts are derived from them, and durations are counted in whole
+# steps so a seeded run plays out identically at any frame rate.
+TICK_RATE = 60
+STEP = 1 / TICK_RATE
+
+def ticks(seconds):
+    return round(seconds * TICK_RATE)
+
+def per_step(speed):
+    return speed / TICK_RATE
+
+# Hitbox sizes used when no sprite is loaded, indexed by entity kind
+PLAYER_SIZE = (60, 40)
+DEFAULT_SIZES = [(5, 10), (40, 40), (30, 30), (50, 50), (35, 35)]
+
+PLAYER_SPEED = 300
+ENEMY_SPEED = 120
+SUPERSEED_SPEED = 180
+POR_SPEED = 150
+LOANSHARK_SPEED_FACTOR = 1.5
+
+# Seconds between spawn waves at the start
+SPAWN_INTERVAL = 1.0
+
+# Bullet velocity per step for each firing angle (degrees from straight up),
+# computed once instead of on every shot
+BULLET_SPEED = 600
+FIRING_ANGLES = (0, -30, 30)
+
+def bullet_velocity(angle, speed=BULLET_SPEED):
+    speed = per_step(speed)
+    return math.sin(math.radians(angle)) * speed, -math.cos(math.radians(angle)) * speed
+
+BULLET_VELOCITIES = {angle: bullet_velocity(angle) for angle in FIRING_ANGLES}
+
+STARTING_DEBT = 10000
+POR_DURATION = 30.0
+NOTIFICATION_DURATION = 3.0
+
+# Balance knobs: the chance of each bonus spawn joining a spawn wave, and the
+# two difficulty steps (enemies speed up once the debt drops below
+# faster_below, and speed up again and spawn more often below hardest_below).
+# A GameState can be given other values to try out a change headless.
+Tuning = namedtuple("Tuning", "superseed_chance loanshark_chance por_chance "
+                              "faster_below faster_speed hardest_below hardest_speed hardest_spawn_interval")
+DEFAULT_TUNING = Tuning(superseed_chance=0.1, loanshark_chance=0.15, por_chance=0.05,
+                        faster_below=8000, faster_speed=150,
+                        hardest_below=5000, hardest_speed=180, hardest_spawn_interval=5 / 6)
+
+# Player inputs for one step: held arrow keys and the number of Space presses
+Inputs = namedtuple("Inputs", "left right fire")
+NO_INPUT = Inputs(False, False, 0)
+
+# Where a ship at x is after one step of inputs. netplay.py predicts the local
+# ship with this too, so it has to stay exactly what step() does.
+def move_ship(x, inputs, speed, width):
+    if inputs.left and x > 0:
+        x -= per_step(speed)
+    if inputs.right and x < WIDTH - width:
+        x += per_step(speed)
+    return x
+
+class Notification:
+    __slots__ = ("text", "duration", "start_time")
+
+    def __init__(self, text, start_time, duration=NOTIFICATION_DURATION):
+        self.text = text
+        self.duration = duration
+        self.start_time = start_time
+
+    def is_expired(self, now):
+        return (now - self.start_time) > self.duration
+
+# Game state for one ship, or for a co-op game with a ship per player (see
+# netplay.py), all paying off the same debt. ship_x holds every ship's x;
+# player_x is the first ship's.
+class GameState:
+    def __init__(self, seed=None, player_size=PLAYER_SIZE, sizes=DEFAULT_SIZES, tuning=DEFAULT_TUNING, players=1):
+        self.seed = seed
+        self.tuning = tuning
+        self.players = players
+        self.rng = random.Random(seed)
+        self.player_width, self.player_height = player_size
+        self.sizes = list(sizes)
+        self.entities = EntityStore(self.sizes)
+        self.reset()
+
+    # Reset game state for play again. The RNG carries on from where it was,
+    # so a sequence of games from one seed is still reproducible.
+    def reset(self):
+        self.frame = 0
+        self.time = 0.0
+        self.debt = STARTING_DEBT
+        self.start_time = None
+        self.game_time = None
+        self.game_over = False
+        self.por_active = False
+        self.por_until = 0
+        self.enemy_speed = ENEMY_SPEED
+        self.spawn_interval = SPAWN_INTERVAL
+        self.enemy_timer = 0
+        self.shots_fired = 0
+        self.spawned = [0] * len(self.sizes)
+        self.hits = []
+        self.entities.clear()
+        self.notifications = []
+        # Ships start spread evenly along the bottom, one in the middle
+        self.ship_x = [WIDTH * (i + 1) // (self.players + 1) - self.player_width // 2 for i in range(self.players)]
+        self.player_y = HEIGHT - self.player_height - 20
+        self.previous_ship_x = list(self.ship_x)
+        self.player_speed = PLAYER_SPEED
+
+    @property
+    def player_x(self):
+        return self.ship_x[0]
+
+    @player_x.setter
+    def player_x(self, x):
+        self.ship_x[0] = x
+
+    @property
+    def previous_player_x(self):
+        return self.previous_ship_x[0]
+
+    def notify(self, text):
+        self.notifications.append(Notification(text, self.time))
+
+    # Falling entities spawn just above the screen at a random column and fall
+    # at speed pixels per second
+    def spawn_falling(self, kind, speed):
+        width, height = self.sizes[kind]
+        self.entities.spawn(kind, self.rng.randint(0, WIDTH - width), -height, 0, per_step(speed))
+        self.spawned[kind] += 1
+
+    def fire_bullet(self, angle=0, ship=0):
+        vx, vy = BULLET_VELOCITIES.get(angle) or bullet_velocity(angle)
+        bullet_width = self.sizes[BULLET][0]
+        self.entities.spawn(BULLET, self.ship_x[ship] + self.player_width//2 - bullet_width//2, self.player_y, vx, vy)
+        self.shots_fired += 1
+
+# Advance the game by one fixed step of STEP seconds. Returns the names of
+# the events that happened this step, in order: "fire", "hit", "powerup",
+# "penalty", "por", "por_expired", "difficulty" (enemies got faster or more
+# frequent) and "game_over". Where this step's hits happened is left in
+# state.hits as (kind, x, y) tuples. The timer gets "movement" and
+# "collisions" laps. inputs is one Inputs, or in a co-op game a list with one
+# per ship; each ship fires and then moves in turn.
+def step(state, inputs, timer=NULL_TIMER):
+    events = []
+    if state.game_over:
+        return events
+    state.frame += 1
+    state.time = state.frame * STEP
+    state.previous_ship_x[:] = state.ship_x
+
+    if isinstance(inputs, Inputs):
+        inputs = (inputs,)
+    for ship, ship_inputs in enumerate(inputs):
+        for _ in range(ship_inputs.fire):
+            if state.por_active:
+                state.fire_bullet(0, ship)
+                state.fire_bullet(-30, ship)
+                state.fire_bullet(30, ship)
+            else:
+                state.fire_bullet(0, ship)
+            events.append("fire")
+            if state.start_time is None:
+                state.start_time = state.time
+        state.ship_x[ship] = move_ship(state.ship_x[ship], ship_inputs, state.player_speed, state.player_width)
+
+    state.enemy_timer += 1
+    if state.enemy_timer >= ticks(state.spawn_interval):
+        state.spawn_falling(ENEMY, state.enemy_speed)
+        tuning = state.tuning
+        if state.rng.random() < tuning.superseed_chance:
+            state.spawn_falling(SUPERSEED, SUPERSEED_SPEED)
+        if state.rng.random() < tuning.loanshark_chance:
+            state.spawn_falling(LOANSHARK, state.enemy_speed * LOANSHARK_SPEED_FACTOR)
+        if state.rng.random() < tuning.por_chance:
+            state.spawn_falling(POR, POR_SPEED)
+        state.enemy_timer = 0
+
+    if state.por_active and state.frame >= state.por_until:
+        state.por_active = False
+        events.append("por_expired")
+
+    entities = state.entities
+    entities.move()
+    entities.cull(WIDTH, HEIGHT)
+
+    if state.notifications and state.notifications[0].is_expired(state.time):
+        state.notifications = [n for n in state.notifications if not n.is_expired(state.time)]
+    timer.lap("movement")
+
+    # Each bullet is consumed by the first thing it hits; hits come back in the
+    # order the old per-kind loops resolved them
+    hits = state.hits = entities.collide()
+    entities.compact()
+    for kind, _, _ in hits:
+        if kind == ENEMY:
+            state.debt -= 10
+            events.append("hit")
+        elif kind == SUPERSEED:
+            state.debt = math.ceil(state.debt * 0.99)
+            events.append("powerup")
+        elif kind == LOANSHARK:
+            state.debt = math.ceil(state.debt * 1.10)
+            state.notify("Loan shark increased your debt by 10%")
+            events.append("penalty")
+        else:
+            state.debt = math.ceil(state.debt * 0.98)
+            state.por_active = True
+            state.por_until = state.frame + ticks(POR_DURATION)
+            state.notify("2% of your debt has been paid with POR")
+            events.append("por")
+
+    tuning = state.tuning
+    difficulty = (state.enemy_speed, state.spawn_interval)
+    if state.debt < tuning.faster_below:
+        state.enemy_speed = tuning.faster_speed
+    if state.debt < tuning.hardest_below:
+        state.enemy_speed = tuning.hardest_speed
+        state.spawn_interval = tuning.hardest_spawn_interval
+    if (state.enemy_speed, state.spawn_interval) != difficulty:
+        events.append("difficulty")
+
+    if state.debt <= 0:
+        state.debt = 0
+        state.game_over = True
+        state.game_time = state.time - state.start_time
+        events.append("game_over")
+    timer.lap("collisions")
+    return events
+
+# Fixed-timestep accumulator for a real-time loop. advance() takes the wall
+# time since the last frame and returns how many steps to run, keeping the
+# remainder; alpha is how far the next step has progressed, for interpolating
+# what is drawn. Dropped frames are made up with extra steps, but a single
+# frame longer than max_frame_time (a stall, a dragged window) only counts as
+# max_frame_time, so the game never fast-forwards through a long freeze.
+class FixedStep:
+    def __init__(self, step=STEP, max_frame_time=0.25):
+        self.step = step
+        self.max_frame_time = max_frame_time
+        self.accumulator = 0.0
+
+    def reset(self):
+        self.accumulator = 0.0
+
+    def advance(self, elapsed):
+        self.accumulator += min(elapsed, self.max_frame_time)
+        steps = 0
+        while self.accumulator >= self.step:
+            self.accumulator -= self.step
+            steps += 1
+        return steps
+
+    @property
+    def alpha(self):
+        return self.accumulator / self.step
+
+# Keep count moneybags and loan sharks (one in five) falling, for measuring
+# the game under load. The first top-up, before the first step, fills the
+# screen; later ones queue above it.
+def keep_swarm(state, count):
+    entities = state.entities
+    missing = count - entities.count_of(ENEMY) - entities.count_of(LOANSHARK)
+    top = 0 if state.frame == 0 else -HEIGHT
+    rng = state.rng
+    for i in range(max(missing, 0)):
+        kind = LOANSHARK if i % 5 == 4 else ENEMY
+        width, height = state.sizes[kind]
+        speed = state.enemy_speed * (LOANSHARK_SPEED_FACTOR if kind == LOANSHARK else 1)
+        entities.spawn(kind, rng.randint(0, WIDTH - width), rng.uniform(top, top + HEIGHT) - height,
+                       0, per_step(speed))
+
+# Run one game to completion (or max_frames) with a policy, a function from
+# the state to that step's Inputs. Returns the final state.
+def simulate(policy, seed=None, max_frames=TICK_RATE * 60 * 60, state=None):
+    if state is None:
+        state = GameState(seed)
+    while not state.game_over and state.frame < max_frames:
+        step(state, policy(state))
+    return state
+
+# Stand under the lowest moneybag and fire whenever the gun is lined up and
+# no loan shark is anywhere in the column a stray bullet would fly up (or, with
+# the POR triple shot, anywhere on screen)
+def chase_policy(state):
+    entities = state.entities
+    rows = entities.rows(ENEMY)
+    if not len(rows):
+        return NO_INPUT
+    target = rows[entities.y[rows].argmax()]
+    enemy_width = state.sizes[ENEMY][0]
+    gun_x = state.player_x + state.player_width // 2
+    aim = entities.x[target] + enemy_width // 2 - gun_x
+    fire = 0
+    if abs(aim) < enemy_width // 2 and state.frame % 6 == 0:
+        sharks = entities.rows(LOANSHARK)
+        shark_width = state.sizes[LOANSHARK][0]
+        in_line = (entities.x[sharks] < gun_x + 5) & (entities.x[sharks] + shark_width > gun_x - 5)
+        fire = 0 if in_line.any() or (state.por_active and len(sharks)) else 1
+    return Inputs(aim < -2, aim > 2, fire)
+
+# Chase the lowest moneybag like chase_policy, but fire whenever lined up
+# without looking out for loan sharks
+def careless_policy(state):
+    entities = state.entities
+    rows = entities.rows(ENEMY)
+    if not len(rows):
+        return NO_INPUT
+    target = rows[entities.y[rows].argmax()]
+    enemy_width = state.sizes[ENEMY][0]
+    aim = entities.x[target] + enemy_width // 2 - (state.player_x + state.player_width // 2)
+    fire = 1 if abs(aim) < enemy_width // 2 and state.frame % 6 == 0 else 0
+    return Inputs(aim < -2, aim > 2, fire)
+
+# Sweep from edge to edge, firing at a steady rate and aiming at nothing
+def sweep_policy(state):
+    left = (state.frame // (TICK_RATE * 3)) % 2 == 1
+    return Inputs(left, not left, 1 if state.frame % 10 == 0 else 0)
+
+# Bot policies by name, for runs driven from the command line
+POLICIES = {
+    "chase": chase_policy,
+    "careless": careless_policy,
+    "sweep": sweep_policy,
+}
+
+# Throughput check: python game.py [games] [seed]
+if __name__ == "__main__":
+    games = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    seed = int(sys.argv[2]) if len(sys.argv) > 2 else 0
+    frames = 0
+    start = time.perf_counter()
+    for game in range(games):
+        state = simulate(chase_policy, seed + game)
+        frames += state.frame
+        result = f"{state.game_time:.2f}s" if state.game_over else f"unfinished, debt ${state.debt}"
+        print(f"Game {game} (seed {seed + game}): {state.frame} frames, {result}")
+    elapsed = time.perf_counter() - start
+    print(f"{frames} frames in {elapsed:.2f}s ({frames / elapsed:.0f} frames/s, "
+          f"{frames / TICK_RATE / elapsed:.0f}x real time)")
@@ -0,0 +1,202 @@
+import argparse
+import queue
+import threading
+import time
+import pygame
+from PIL import Image
+from perf import resident_memory
+
+# Streaming source for an animated GIF. Rather than decoding every frame up
+# front and keeping them all as full-size surfaces (800x600 RGBA is 1.9 MB a
+# frame, for as long as the game runs), a background thread decodes frames in
+# order, scales them to their render size and hands them over through a ring
+# buffer of buffer_frames frames. The thread blocks while the buffer is full,
+# so memory stays bounded however long the GIF is, and loops back to the first
+# frame at the end. close() stops the thread and lets go of every frame.
+#
+# Frames are stored as 24-bit RGB surfaces (3 bytes a pixel), or with
+# storage="palette" as 8-bit surfaces using the GIF's own palette (1 byte a
+# pixel; frames Pillow hands back as RGB are mapped onto the first frame's
+# palette). Either is blitted to the screen as is, with pygame converting on
+# the fly.
+#
+# Without threads (the web build) each frame is decoded when it is asked for.
+
+STORAGE = ["rgb", "palette"]
+
+# Frame time used when the GIF does not give one, in ms
+DEFAULT_DURATION = 100
+
+class GifStream:
+    def __init__(self, path, size, buffer_frames=4, storage="rgb", threaded=True):
+        if storage not in STORAGE:
+            raise ValueError(f"unknown GIF storage {storage}, expected one of {', '.join(STORAGE)}")
+        self.path = path
+        self.size = tuple(size)
+        self.storage = storage
+        self.frames = queue.Queue(maxsize=buffer_frames)
+        self.frame_count = None
+        self.decoded = 0
+        self.peak_bytes = 0
+        self.stopped = threading.Event()
+        self.palette = None
+        self.source = self._decode()
+        self.thread = None
+        if threaded:
+            self.thread = threading.Thread(target=self._fill, name="gif-stream", daemon=True)
+            self.thread.start()
+
+    # Frames as (surface, duration in ms), looping over the GIF for as long as
+    # the stream is open
+    def _decode(self):
+        with Image.open(self.path) as gif:
+            index = 0
+            while not self.stopped.is_set():
+                try:
+                    gif.seek(index)
+                except EOFError:
+                    self.frame_count = index
+                    if index <= 1:
+                        return
+                    index = 0
+                    continue
+                yield self._surface(gif), gif.info.get("duration") or DEFAULT_DURATION
+                index += 1
+
+    def _surface(self, frame):
+        colorkey = None
+        if self.storage == "palette" and frame.mode == "P":
+            if self.palette is None:
+                self.palette = Image.new("P", (1, 1))
+                self.palette.putpalette(frame.getpalette())
+            image = frame
+            colorkey = frame.info.get("transparency")
+        elif frame.mode == "RGBA" or "transparency" in frame.info:
+            # Transparent pixels show the black the intro draws behind the GIF
+            rgba = frame.convert("RGBA")
+            image = Image.new("RGB", rgba.size)
+            image.paste(rgba, mask=rgba.getchannel("A"))
+        else:
+            image = frame.convert("RGB")
+        if self.storage == "palette" and image.mode != "P" and self.palette is not None:
+            image = image.quantize(palette=self.palette, dither=Image.Dither.NONE)
+        if image.size != self.size:
+            image = image.resize(self.size, Image.NEAREST)
+
+        surface = pygame.image.frombytes(image.tobytes(), image.size, image.mode)
+        if image.mode == "P":
+            palette = image.getpalette()
+            surface.set_palette([tuple(palette[i:i + 3]) for i in range(0, len(palette), 3)])
+            if colorkey is not None:
+                surface.set_colorkey(colorkey)
+        self.decoded += 1
+        return surface
+
+    def _fill(self):
+        try:
+            for frame in self.source:
+                while not self.stopped.is_set():
+                    try:
+                        self.frames.put(frame, timeout=0.1)
+                        break
+                    except queue.Full:
+                        continue
+                self.peak_bytes = max(self.peak_bytes, self.buffered_bytes())
+        except Exception as e:
+            print(f"Error streaming GIF {self.path}: {e}")
+        finally:
+            self.frames.put(None)
+
+    # The next (surface, duration) pair, or None if it is not decoded yet or
+    # the GIF has no more frames (it had only one, or it is closed)
+    def next_frame(self):
+        if self.thread is None:
+            frame = next(self.source, None) if not self.stopped.is_set() else None
+            if frame is None:
+                self.stopped.set()
+            return frame
+        try:
+            frame = self.frames.get_nowait()
+        except queue.Empty:
+            return None
+        if frame is None:
+            self.stopped.set()
+        return frame
+
+    # Block until the next frame is decoded, for at most timeout seconds
+    def wait_frame(self, timeout=1.0):
+        if self.thread is None:
+            return self.next_frame()
+        try:
+            frame = self.frames.get(timeout=timeout)
+        except queue.Empty:
+            return None
+        if frame is None:
+            self.stopped.set()
+        return frame
+
+    # True once no more frames will come
+    @property
+    def finished(self):
+        return self.stopped.is_set() and self.frames.empty()
+
+    def buffered_bytes(self):
+        with self.frames.mutex:
+            frames = list(self.frames.queue)
+        return sum(frame[0].get_bytesize() * frame[0].get_width() * frame[0].get_height()
+                   for frame in frames if frame)
+
+    def close(self):
+        self.stopped.set()
+        if self.thread:
+            # Empty the buffer so a blocked put() sees the stop
+            while self.thread.is_alive():
+                try:
+                    self.frames.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            self.thread.join()
+            self.thread = None
+        self.source.close()
+        with self.frames.mutex:
+            self.frames.queue.clear()
+
+def megabytes(size):
+    return "unknown" if size is None else f"{size / 2**20:.1f} MB"
+
+# Memory check: python gifstream.py FILE [--storage rgb|palette] [--seconds S]
+# Streams the GIF for a while and reports resident memory before, during and
+# after, next to what decoding every frame up front takes.
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Resident memory of a streamed GIF")
+    parser.add_argument("gif")
+    parser.add_argument("--size", type=int, nargs=2, default=(800, 600))
+    parser.add_argument("--storage", choices=STORAGE, default="rgb")
+    parser.add_argument("--buffer", type=int, default=4, help="ring buffer size in frames")
+    parser.add_argument("--seconds", type=float, default=3.0)
+    parser.add_argument("--preload", action="store_true", help="also decode every frame up front, as before")
+    args = parser.parse_args()
+
+    before = resident_memory()
+    stream = GifStream(args.gif, args.size, args.buffer, args.storage)
+    end = time.perf_counter() + args.seconds
+    shown = 0
+    while time.perf_counter() < end and not stream.finished:
+        if stream.wait_frame(0.1):
+            shown += 1
+    during = resident_memory()
+    stream.close()
+    after = resident_memory()
+    print(f"Streamed {shown} frames ({stream.frame_count or 'not all'} in the GIF), "
+          f"buffer peak {megabytes(stream.peak_bytes)}")
+    print(f"Resident memory: {megabytes(before)} before, {megabytes(during)} while streaming, "
+          f"{megabytes(after)} after closing")
+
+    if args.preload:
+        frames = []
+        with Image.open(args.gif) as gif:
+            for index in range(getattr(gif, "n_frames", 1)):
+                gif.seek(index)
+                frame = pygame.image.frombytes(gif.convert("RGBA").tobytes(), gif.size, "RGBA")
+                frames.append(pygame.transform.scale(frame, args.size))
+        print(f"Decoding all {len(frames)} frames up front: {megabytes(resident_memory())} resident")
@@ -0,0 +1,181 @@
+import json
+import os
+import queue
+import threading
+import time
+from collections import namedtuple
+
+# Local leaderboard. Every finished run is appended to a log, one JSON line
+# per run, and a small index holds the best top_n runs (fastest to pay off
+# the debt) along with how many runs there have been and how much of the log
+# it covers. Startup reads the index plus whatever the log gained after the
+# index was last written, so it costs the same however long the history is.
+#
+# add() updates the in-memory board at once, so the end screen can show the
+# rank straight away, and hands the disk writes to a background thread.
+# Once the log holds more than compact_after runs that can no longer make the
+# board, the writer rewrites it with just the board, under a header line
+# holding a new generation number. The index records the generation it was
+# written against, so an index left behind by a crash just after a compaction
+# is noticed and the log reread from the start. A final record cut short by a
+# crash is dropped from the log the next time it is loaded.
+
+Score = namedtuple("Score", "game_time name timestamp")
+
+class Leaderboard:
+    def __init__(self, folder, top_n=100, compact_after=1000, threaded=True):
+        self.folder = folder
+        self.log_path = os.path.join(folder, "runs.jsonl")
+        self.index_path = os.path.join(folder, "index.json")
+        self.top_n = top_n
+        self.compact_after = compact_after
+        self.scores = []
+        self.runs = 0
+        self.log_size = 0
+        self.log_runs = 0
+        self.generation = 0
+        os.makedirs(folder, exist_ok=True)
+        self._load()
+        self.pending = queue.Queue()
+        self.writer = None
+        if threaded:
+            self.writer = threading.Thread(target=self._write_loop, name="leaderboard-writer", daemon=True)
+            self.writer.start()
+
+    def _load(self):
+        try:
+            with open(self.index_path) as f:
+                index = json.load(f)
+            self.scores = [Score(*score) for score in index["top"]]
+            self.runs = index["runs"]
+            self.log_size = index["log_size"]
+            self.log_runs = index["log_runs"]
+            self.generation = index.get("generation", 0)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"Error reading leaderboard index: {e}, rebuilding it from the log")
+            self.scores, self.runs, self.log_size, self.log_runs = [], 0, 0, 0
+            self.generation = 0
+
+        # Runs logged after the index was written, up to the last whole line
+        rebuild = False
+        try:
+            with open(self.log_path, "rb") as f:
+                generation = _log_generation(f.readline())
+                if generation != self.generation or os.fstat(f.fileno()).st_size < self.log_size:
+                    # The log was compacted after this index was written; its
+                    # runs are already counted
+                    print("Leaderboard index is out of date, rebuilding it from the log")
+                    self.scores, self.log_size, self.log_runs = [], 0, 0
+                    self.generation = generation
+                    rebuild = True
+                f.seek(self.log_size)
+                tail = f.read()
+        except FileNotFoundError:
+            return
+        complete = tail[:tail.rfind(b"\n") + 1]
+        for line in complete.splitlines():
+            try:
+                record = json.loads(line)
+                if isinstance(record, dict):
+                    # The header of a compacted log, not a run
+                    continue
+                self._insert(Score(*record))
+            except Exception:
+                print(f"Skipping a damaged leaderboard record: {line[:60]!r}")
+            self.runs += not rebuild
+            self.log_runs += 1
+        if len(complete) < len(tail):
+            print(f"Dropping a truncated record from the end of {self.log_path}")
+            with open(self.log_path, "r+b") as f:
+                f.truncate(self.log_size + len(complete))
+        if complete or rebuild:
+            self.log_size += len(complete)
+            self._write_index(self.scores, self.runs)
+
+    def _insert(self, score):
+        scores = self.scores
+        i = len(scores)
+        while i and scores[i - 1].game_time > score.game_time:
+            i -= 1
+        if i >= self.top_n:
+            return None
+        scores.insert(i, score)
+        del scores[self.top_n:]
+        return i + 1
+
+    # Record a finished run. Returns its rank on the board (1 is best), or
+    # None if it did not make the top top_n.
+    def add(self, name, game_time):
+        score = Score(round(game_time, 3), name, int(time.time()))
+        rank = self._insert(score)
+        self.runs += 1
+        # The writer gets its own copy of the board to write out
+        write = (score, list(self.scores), self.runs)
+        if self.writer:
+            self.pending.put(write)
+        else:
+            self._append(*write)
+        return rank
+
+    def top(self, n=10):
+        return self.scores[:n]
+
+    def _write_loop(self):
+        while True:
+            write = self.pending.get()
+            if write is None:
+                break
+            try:
+                self._append(*write)
+            except Exception as e:
+                print(f"Error writing leaderboard: {e}")
+
+    def _append(self, score, scores, runs):
+        line = (json.dumps(list(score)) + "\n").encode()
+        with open(self.log_path, "ab") as f:
+            f.write(line)
+        self.log_size += len(line)
+        self.log_runs += 1
+        if self.log_runs - len(scores) > self.compact_after:
+            self._compact(scores)
+        self._write_index(scores, runs)
+
+    # Rewrite the log with only the runs on the board, as a new generation
+    def _compact(self, scores):
+        generation = self.generation + 1
+        header = (json.dumps({"generation": generation}) + "\n").encode()
+        data = header + b"".join((json.dumps(list(score)) + "\n").encode() for score in scores)
+        self._replace(self.log_path, data)
+        print(f"Compacted leaderboard log from {self.log_runs} to {len(scores)} runs")
+        self.log_size = len(data)
+        self.log_runs = len(scores)
+        self.generation = generation
+
+    def _write_index(self, scores, runs):
+        index = {"runs": runs, "log_size": self.log_size, "log_runs": self.log_runs,
+                 "generation": self.generation, "top": [list(score) for score in scores]}
+        self._replace(self.index_path, json.dumps(index).encode())
+
+    def _replace(self, path, data):
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    # Finish any writes still queued
+    def close(self):
+        if self.writer:
+            self.pending.put(None)
+            self.writer.join()
+            self.writer = None
+
+# Generation of a log from its first line: the header a compaction writes, or
+# 0 for a log that has never been compacted
+def _log_generation(line):
+    try:
+        record = json.loads(line)
+    except ValueError:
+        return 0
+    return record.get("generation", 0) if isinstance(record, dict) else 0
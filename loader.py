@@ -0,0 +1,79 @@
+import queue
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# Background asset loader. Each task's decode function runs on a worker
+# thread and hands its results back with emit(); the matching finish function
+# then runs on the main thread when poll() is called, which is where anything
+# touching the display (Surface.convert and friends) has to happen. A task can
+# emit several results, one per GIF frame say, each finished in turn. With no
+# workers (the web build has no threads) tasks are queued instead and poll()
+# runs their decode on the main thread too, one at a time within its budget,
+# so the intro still draws between assets.
+class AssetLoader:
+    def __init__(self, workers=4):
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="asset-loader") if workers else None
+        self.results = queue.Queue()
+        self.pending = deque()
+        self.total = 0
+        self.completed = 0
+        self.started_at = time.perf_counter()
+        self.finished_at = None
+
+    # decode(emit, *args) runs on a worker; finish(value) runs on the main
+    # thread for every emitted value
+    def submit(self, name, decode, finish, *args):
+        self.total += 1
+        self.finished_at = None
+        if self.pool:
+            self.pool.submit(self._run, name, decode, finish, args)
+        else:
+            self.pending.append((name, decode, finish, args))
+
+    def _run(self, name, decode, finish, args):
+        try:
+            decode(lambda value: self.results.put((finish, value)), *args)
+        except Exception as e:
+            print(f"Error loading {name}: {e}")
+        finally:
+            self.results.put((self._complete, name))
+
+    def _complete(self, name):
+        self.completed += 1
+        if self.completed == self.total:
+            self.finished_at = time.perf_counter()
+
+    @property
+    def finished(self):
+        return self.completed == self.total
+
+    def progress(self):
+        return self.completed / self.total if self.total else 1.0
+
+    # Run finished results on the main thread, and with no workers decode
+    # queued tasks once the results run out. With a budget (in seconds) it
+    # stops once that much time has been spent, so a frame is never stalled
+    # for long (a single decode can still overrun it); with block it waits for
+    # at least one result. Returns how many results were handled.
+    def poll(self, budget=None, block=False):
+        deadline = None if budget is None else time.perf_counter() + budget
+        handled = 0
+        while True:
+            try:
+                finish, value = self.results.get(block=block and not self.pending)
+            except queue.Empty:
+                if not self.pending:
+                    return handled
+                self._run(*self.pending.popleft())
+            else:
+                block = False
+                finish(value)
+                handled += 1
+            if deadline is not None and time.perf_counter() >= deadline:
+                return handled
+
+    # Block until every submitted task is done
+    def wait(self):
+        while not self.finished:
+            self.poll(block=True)
@@ -1,10 +1,37 @@
+import time
+STARTUP_TIME = time.perf_counter()
+
 import pygame
-import random
-import math
+import argparse
+import asyncio
 import sys
 import os
 from pygame import mixer
-from PIL import Image, ImageSequence
+from assetprep import prepare_image
+from entities import BULLET, ENEMY, SUPERSEED, LOANSHARK, POR
+from game import GameState, Inputs, FixedStep, step, STEP, WIDTH, HEIGHT
+from perf import FramePacing, FrameTimer, NULL_TIMER, resident_memory
+from overlay import ProfilerOverlay
+from frametrace import TraceRecorder
+from replay import ReplayRecorder
+from audio import AudioManager
+from leaderboard import Leaderboard
+from particles import ParticleSystem
+from textcache import TextCache
+from dirty import DirtyRenderer
+try:
+    from textures import TextureRenderer
+except ImportError as e:
+    print(f"Texture renderer unavailable: {e}")
+    TextureRenderer = None
+try:
+    from netplay import CoopClient, parse_address
+except ImportError as e:
+    print(f"Co-op play unavailable: {e}")
+    CoopClient = None
+from loader import AssetLoader
+from gifstream import GifStream, STORAGE, megabytes
+from assetpack import load_pack, wait_for_build
 
 # Initialize Pygame and mixer
 try:
@@ -16,16 +43,37 @@ except Exception as e:
     sys.exit(1)
 
 # Set up the display
-WIDTH = 800
-HEIGHT = 600
 try:
     screen = pygame.display.set_mode((WIDTH, HEIGHT))
     pygame.display.set_caption("Debt Blaster")
+    display_scaled = False
     print("Display set up successfully")
 except Exception as e:
     print(f"Error setting up display: {e}")
     sys.exit(1)
 
+# Switch the window to pygame's SCALED mode, which presents through an SDL
+# renderer at the game's logical size and scales to whatever size the window
+# is. Vsync and the texture renderer both need it.
+def open_scaled_display(vsync=False):
+    global screen, display_scaled
+    flags = pygame.SCALED | pygame.RESIZABLE
+    try:
+        screen = pygame.display.set_mode((WIDTH, HEIGHT), flags, vsync=int(vsync))
+    except pygame.error:
+        # Some drivers cannot put a renderer on the window that is already
+        # open, so open a new one
+        pygame.display.quit()
+        pygame.display.init()
+        try:
+            screen = pygame.display.set_mode((WIDTH, HEIGHT), flags, vsync=int(vsync))
+        finally:
+            # Whatever failed, leave a window to draw on
+            if pygame.display.get_surface() is None:
+                screen = pygame.display.set_mode((WIDTH, HEIGHT))
+            pygame.display.set_caption("Debt Blaster")
+    display_scaled = True
+
 # Colors (for fallbacks)
 WHITE = (255, 255, 255)
 BLACK = (0, 0, 0)
@@ -35,57 +83,40 @@ YELLOW = (255, 255, 0)
 GRAY = (150, 150, 150)
 PURPLE = (128, 0, 128)
 
-# Load images with fallbacks
-def load_image(path, fallback_color, fallback_size):
-    try:
-        if os.path.exists(path):
-            img = pygame.image.load(path).convert_alpha()
-            print(f"Loaded {path} successfully")
-            return img, img.get_width(), img.get_height()
-        else:
-            print(f"File {path} not found, using fallback")
-            return None, fallback_size[0], fallback_size[1]
-    except Exception as e:
-        print(f"Error loading {path}: {e}, using fallback")
-        return None, fallback_size[0], fallback_size[1]
+# Asset decoding runs on loader threads: each decode function hands what it
+# decoded to emit(), and the main thread converts it for the display. Assets
+# found in the pre-baked asset pack are taken from it without decoding.
+pack = None
 
-# Load GIF frames and pre-scale them
-def load_gif(path, target_size):
+# Decode images with fallbacks, scaled to their render size if one is given
+def decode_image(emit, path, size=None):
     try:
-        if os.path.exists(path):
-            gif = Image.open(path)
-            frames = []
-            for frame in ImageSequence.Iterator(gif):
-                frame = frame.convert('RGBA')
-                mode = frame.mode
-                size = frame.size
-                data = frame.tobytes()
-                pygame_frame = pygame.image.fromstring(data, size, mode)
-                # Pre-scale the frame to the target size
-                scaled_frame = pygame.transform.scale(pygame_frame, target_size)
-                frames.append(scaled_frame)
-            print(f"Loaded GIF {path} with {len(frames)} frames")
-            return frames
+        packed = pack.image(os.path.basename(path)) if pack else None
+        if packed is not None:
+            if size is not None and packed.get_size() != tuple(size):
+                packed = pygame.transform.scale(packed, size)
+            emit(packed)
+        elif os.path.exists(path):
+            img = pygame.image.load(path)
+            if size is not None and img.get_size() != tuple(size):
+                img = pygame.transform.scale(img, size)
+            emit(img)
         else:
             print(f"File {path} not found, using fallback")
-            return None
     except Exception as e:
-        print(f"Error loading GIF {path}: {e}, using fallback")
-        return None
+        print(f"Error loading {path}: {e}, using fallback")
 
-# Load sounds with fallbacks
-def load_sound(path):
+# Decode sounds with fallbacks
+def decode_sound(emit, path):
     try:
-        if os.path.exists(path):
-            sound = mixer.Sound(path)
-            print(f"Loaded {path} successfully")
-            return sound
+        if pack and os.path.basename(path) in pack:
+            emit(pack.sound(os.path.basename(path)))
+        elif os.path.exists(path):
+            emit(mixer.Sound(path))
         else:
             print(f"File {path} not found, no sound")
-            return None
     except Exception as e:
         print(f"Error loading {path}: {e}, no sound")
-        return None
 
 # Load music with fallbacks
 def load_music(path):
@@ -101,198 +132,455 @@ def load_music(path):
         print(f"Error loading music {path}: {e}, no music")
         return False
 
-# Asset loading
+# Asset loading. Everything is decoded in the background while the intro
+# plays. Prepared surfaces go into the sprites registry, which is what the
+# draw code reads from (None means draw the fallback rectangle), and sounds
+# go to the audio manager (a sound it does not have stays silent).
 assets_folder = "assets"
-player_img, player_width, player_height = load_image(os.path.join(assets_folder, "spaceship.png"), GREEN, (60, 40))
-enemy_img, enemy_width, enemy_height = load_image(os.path.join(assets_folder, "moneybag.png"), RED, (40, 40))
-superseed_img, superseed_width, superseed_height = load_image(os.path.join(assets_folder, "superseed.png"), YELLOW, (30, 30))
-loanshark_img, loanshark_width, loanshark_height = load_image(os.path.join(assets_folder, "loanshark.png"), GRAY, (50, 50))
-bullet_img, bullet_width, bullet_height = load_image(os.path.join(assets_folder, "bullet.png"), WHITE, (5, 10))
-por_img, por_width, por_height = load_image(os.path.join(assets_folder, "por.png"), PURPLE, (35, 35))
-background_img, bg_width, bg_height = load_image(os.path.join(assets_folder, "background.png"), BLACK, (WIDTH, HEIGHT))
-intro_gif_frames = load_gif(os.path.join(assets_folder, "intro_background.gif"), (WIDTH, HEIGHT))
-end_bg, end_width, end_height = load_image(os.path.join(assets_folder, "end_background.png"), BLACK, (WIDTH, HEIGHT))
-
-# Audio loading
+# A missing or stale pack is rebuilt in the background for the next run,
+# except in the browser, which has no threads to do it on
+pack = load_pack(assets_folder, rebuild=sys.platform != "emscripten")
+# No threads in the browser, so the web build decodes a little at a time in
+# loader.poll() between intro frames
+loader = AssetLoader(workers=0 if sys.platform == "emscripten" else 4)
+audio = AudioManager()
+sprites = {}
+sprite_sizes = {}
+startup_timings = {}
+
+def load_sprite(name, filename, fallback_size, size=None):
+    path = os.path.join(assets_folder, filename)
+    sprites[name] = None
+    sprite_sizes[name] = tuple(size or fallback_size)
+
+    def finish(img):
+        prepared, mode = prepare_image(img)
+        sprites[name] = prepared
+        sprite_sizes[name] = prepared.get_size()
+        print(f"Loaded {path} successfully ({mode})")
+    loader.submit(path, decode_image, finish, path, size)
+
+def load_sound(name, filename, category):
+    path = os.path.join(assets_folder, filename)
+
+    def finish(sound):
+        audio.add(name, sound, category)
+        print(f"Loaded {path} successfully")
+    loader.submit(path, decode_sound, finish, path)
+
+# The narration is decoded in full, so starting it never touches the disk and
+# the music stream stays free for the background music
+load_sound("narration", "intro_narration.mp3", "voice")
+load_sprite("player", "spaceship.png", (60, 40))
+load_sprite("enemy", "moneybag.png", (40, 40))
+load_sprite("superseed", "superseed.png", (30, 30))
+load_sprite("loanshark", "loanshark.png", (50, 50))
+load_sprite("bullet", "bullet.png", (5, 10))
+load_sprite("por", "por.png", (35, 35))
+load_sprite("background", "background.png", (WIDTH, HEIGHT), (WIDTH, HEIGHT))
+load_sprite("end_background", "end_background.png", (WIDTH, HEIGHT), (WIDTH, HEIGHT))
+load_sound("bullet", "bullet_shot.wav", "fire")
+load_sound("hit", "hit.wav", "impact")
+load_sound("powerup", "powerup.wav", "impact")
+load_sound("penalty", "penalty.wav", "alert")
+load_sound("por", "por_collect.wav", "alert")
+
+# Background music is streamed by mixer.music. It is loaded once here and
+# only started and stopped after that.
 background_music = os.path.join(assets_folder, "background_music.mp3")
-intro_narration = os.path.join(assets_folder, "intro_narration.mp3")
-bullet_sound = load_sound(os.path.join(assets_folder, "bullet_shot.wav"))
-hit_sound = load_sound(os.path.join(assets_folder, "hit.wav"))
-powerup_sound = load_sound(os.path.join(assets_folder, "powerup.wav"))
-penalty_sound = load_sound(os.path.join(assets_folder, "penalty.wav"))
-por_sound = load_sound(os.path.join(assets_folder, "por_collect.wav"))
-
-# Load background music (but don't play yet)
 background_music_loaded = load_music(background_music)
 
-# Load intro narration
-intro_narration_loaded = load_music(intro_narration)
-
-# Player
-player_x = WIDTH // 2 - player_width // 2
-player_y = HEIGHT - player_height - 20
-player_speed = 5
-
 # Game variables
-debt = 10000
 game_active = False
-start_time = 0
 player_name = ""
-por_active = False
-por_timer = 0
-
-# Enemy settings
-enemy_speed = 2
-enemy_spawn_rate = 60
-enemy_timer = 0
-
-# Lists for game objects
-enemies = []
-bullets = []
-superseeds = []
-loansharks = []
-pors = []
-
-# Notification system
-notifications = []
-class Notification:
-    def __init__(self, text, duration=3000):
-        self.text = text
-        self.duration = duration
-        self.start_time = pygame.time.get_ticks()
-
-    def is_expired(self):
-        return (pygame.time.get_ticks() - self.start_time) > self.duration
+
+# Best runs so far, kept in the leaderboard folder (written on a background
+# thread, except in the browser which has none)
+try:
+    leaderboard = Leaderboard("leaderboard", threaded=sys.platform != "emscripten")
+    print(f"Leaderboard loaded ({leaderboard.runs} runs)")
+except Exception as e:
+    print(f"Error loading leaderboard: {e}, scores will not be saved")
+    leaderboard = None
+
+# Simulation state: player, debt, timers and the entity store. It is created
+# by finish_loading(), once the sprite sizes (the hitboxes) are known.
+state = None
+
+# Sounds played for the events returned by step()
+event_sounds = {
+    "fire": "bullet",
+    "hit": "hit",
+    "powerup": "powerup",
+    "penalty": "penalty",
+    "por": "por",
+}
+
+# Block until every asset is loaded, then set up the simulation state
+def finish_loading():
+    global state
+    if not loader.finished:
+        loader.wait()
+    if "assets_loaded_ms" not in startup_timings:
+        startup_timings["assets_loaded_ms"] = (loader.finished_at - STARTUP_TIME) * 1000
+        print(f"All assets loaded after {startup_timings['assets_loaded_ms']:.0f} ms")
+    if state is None:
+        state = GameState(player_size=sprite_sizes["player"],
+                          sizes=[sprite_sizes[name] for name in ("bullet", "enemy", "superseed", "loanshark", "por")])
+
+# Thin progress bar along the bottom of the screen while assets are loading
+def draw_loading_progress():
+    if loader.finished:
+        return
+    bar = pygame.Rect(20, HEIGHT - 12, WIDTH - 40, 6)
+    pygame.draw.rect(screen, GRAY, bar, 1)
+    pygame.draw.rect(screen, WHITE, (bar.x, bar.y, int(bar.width * loader.progress()), bar.height))
 
 # Font (using bold system font)
 try:
     font = pygame.font.SysFont("Arial", 36, bold=True)
+    small_font = pygame.font.Font(None, 22)
     print("Font initialized successfully")
 except Exception as e:
     print(f"Error initializing font: {e}")
     sys.exit(1)
 
-# Function to render text with outline
-def render_text_with_outline(text, font, color, outline_color, pos):
-    text_surface = font.render(text, True, color)
-    outline_surface = font.render(text, True, outline_color)
-    for offset in [(-2, -2), (-2, 2), (2, -2), (2, 2), (0, -2), (0, 2), (-2, 0), (2, 0)]:
-        screen.blit(outline_surface, (pos[0] + offset[0], pos[1] + offset[1]))
-    screen.blit(text_surface, pos)
+# Rendered text is cached, so unchanged strings are not rasterized again
+text_cache = TextCache()
+OUTLINE_WIDTH = 2
+
+# Outlined text as a (surface, position) pair ready for blitting
+def outlined_text(text, font, color, outline_color, pos):
+    surface = text_cache.render(text, font, color, outline_color, OUTLINE_WIDTH)
+    return surface, (pos[0] - OUTLINE_WIDTH, pos[1] - OUTLINE_WIDTH)
 
 # Reset game state for play again
 def reset_game():
-    global debt, game_active, start_time, player_name, por_active, por_timer, enemy_speed, enemy_spawn_rate, enemy_timer
-    global enemies, bullets, superseeds, loansharks, pors, player_x, notifications
-    debt = 10000
+    global game_active, player_name
     game_active = False
-    start_time = 0
     player_name = ""
-    por_active = False
-    por_timer = 0
-    enemy_speed = 2
-    enemy_spawn_rate = 60
-    enemy_timer = 0
-    enemies = []
-    bullets = []
-    superseeds = []
-    loansharks = []
-    pors = []
-    notifications = []
-    player_x = WIDTH // 2 - player_width // 2
-
-class Enemy:
-    def __init__(self):
-        self.x = random.randint(0, WIDTH - enemy_width)
-        self.y = -enemy_height
-        self.speed = enemy_speed
-
-class Bullet:
-    def __init__(self, x, y, angle=0):
-        self.x = x
-        self.y = y
-        self.angle = angle
-        self.speed = 10
-        self.vx = math.sin(math.radians(self.angle)) * self.speed
-        self.vy = -math.cos(math.radians(self.angle)) * self.speed
-
-    def update(self):
-        self.x += self.vx
-        self.y += self.vy
-
-class SuperSeed:
-    def __init__(self):
-        self.x = random.randint(0, WIDTH - superseed_width)
-        self.y = -superseed_height
-        self.speed = 3
-
-class LoanShark:
-    def __init__(self):
-        self.x = random.randint(0, WIDTH - loanshark_width)
-        self.y = -loanshark_height
-        self.speed = enemy_speed * 1.5
-
-class POR:
-    def __init__(self):
-        self.x = random.randint(0, WIDTH - por_width)
-        self.y = -por_height
-        self.speed = 2.5
-
-def show_intro():
-    if intro_narration_loaded:
-        mixer.music.play()
-        print("Intro narration started")
+    if state:
+        state.reset()
+    particles.clear()
+
+# Full-screen backgrounds are prepared at screen size, so an opaque one simply
+# replaces the previous frame without clearing it first
+def draw_background(name):
+    background = sprites[name]
+    if background is None or background.get_flags() & pygame.SRCALPHA or background.get_colorkey():
+        screen.fill(BLACK)
+    if background:
+        screen.blit(background, (0, 0))
+
+# Entity sprites in draw order: registry name, entity kind and fallback color
+ENTITY_SPRITES = [
+    ("bullet", BULLET, WHITE),
+    ("enemy", ENEMY, RED),
+    ("superseed", SUPERSEED, YELLOW),
+    ("loanshark", LOANSHARK, GRAY),
+    ("por", POR, PURPLE),
+]
+
+# Particle bursts for hits, by the kind of entity hit
+particles = ParticleSystem(WIDTH, HEIGHT)
+HIT_EFFECTS = {
+    ENEMY: "hit",
+    SUPERSEED: "powerup",
+    LOANSHARK: "penalty",
+    POR: "por",
+}
+
+# Burst particles where the last step's hits happened, then move every
+# particle on by steps steps. Called after every step(), or in a co-op game
+# once a frame with the hits the server reported.
+def update_particles(state, steps=1):
+    for kind, x, y in state.hits:
+        particles.burst(HIT_EFFECTS[kind], x, y)
+    for _ in range(steps):
+        particles.update(STEP)
+
+# Sprites for one gameplay frame in draw order, as (surface, fallback color,
+# size, positions) batches; surface is None when the fallback rectangle is used.
+# alpha is how far the frame is between the previous simulation step and the
+# current one.
+def sprite_batches(state, alpha=1.0):
+    ships = [(previous + (x - previous) * alpha, state.player_y)
+             for previous, x in zip(state.previous_ship_x, state.ship_x)]
+    batches = [(sprites["player"], GREEN, sprite_sizes["player"], ships)]
+    for name, kind, color in ENTITY_SPRITES:
+        batches.append((sprites[name], color, sprite_sizes[name], state.entities.positions(kind, alpha)))
+    return batches
+
+# HUD text for one gameplay frame: the debt and any active notifications
+def hud_text(state):
+    texts = [outlined_text(f"Debt: ${state.debt}", font, WHITE, BLACK, (10, 10))]
+    for i, notification in enumerate(state.notifications):
+        position = (WIDTH//2 - len(notification.text)*10, HEIGHT//2 + i*40)
+        texts.append(outlined_text(notification.text, font, WHITE, BLACK, position))
+    return texts
+
+# Performance HUD (F3) in the top right corner
+profiler_overlay = ProfilerOverlay(small_font, WIDTH - 10, 10)
+
+# Live entity counts in the order the overlay and trace report them
+COUNT_LABELS = ["bullets", "enemies", "superseeds", "loansharks", "pors", "notifications"]
+
+def live_counts(state):
+    return state.entities.counts() + [len(state.notifications)]
+
+# Gameplay renderer: "full" redraws the whole screen surface every frame,
+# "dirty" uses a DirtyRenderer that only redraws and updates what changed and
+# "texture" a TextureRenderer that draws with the SDL renderer. The menu
+# screens always draw on the screen surface.
+RENDERERS = ["full", "dirty", "texture"]
+dirty_renderer = None
+texture_renderer = None
+
+def use_renderer(name):
+    global dirty_renderer, texture_renderer
+    dirty_renderer = texture_renderer = None
+    if name == "texture":
+        try:
+            if TextureRenderer is None:
+                raise RuntimeError("pygame._sdl2 is not available")
+            if not display_scaled:
+                open_scaled_display()
+            texture_renderer = TextureRenderer(sprites["background"], BLACK)
+        except Exception as e:
+            print(f"Error setting up texture renderer: {e}, using full renderer")
+            name = "full"
+    elif name == "dirty":
+        dirty_renderer = DirtyRenderer(screen, sprites["background"], BLACK)
+    print(f"Using {name} renderer")
+
+# Draw one gameplay frame: background, sprites, particles and the HUD. The
+# timer gets a "draw" lap for the sprites and particles and a "text" lap for
+# the outlined HUD text. Returns the rects that changed, or None if the whole
+# screen did.
+def draw_game(state, timer=NULL_TIMER, alpha=1.0):
+    def effects(surface):
+        return particles.draw(surface, STEP, alpha)
+
+    if texture_renderer:
+        return texture_renderer.draw(sprite_batches(state, alpha), hud_text(state) + profiler_overlay.texts(),
+                                     timer, effects)
+    if dirty_renderer:
+        return dirty_renderer.draw(sprite_batches(state, alpha), hud_text(state) + profiler_overlay.texts(),
+                                   timer, effects)
+
+    draw_background("background")
+    for sprite, color, size, positions in sprite_batches(state, alpha):
+        if sprite:
+            screen.blits(((sprite, position) for position in positions), doreturn=False)
+        else:
+            for position in positions:
+                pygame.draw.rect(screen, color, (position, size))
+    effects(screen)
+    timer.lap("draw")
+    screen.blits(hud_text(state) + profiler_overlay.texts(), doreturn=False)
+    timer.lap("text")
+    return None
+
+# Show a drawn frame, pushing only the changed rects when they are known
+def present(rects=None):
+    if texture_renderer:
+        texture_renderer.present()
+    elif rects is None:
+        pygame.display.flip()
+    else:
+        pygame.display.update(rects)
+
+# Time per frame the menu screens spend finishing loaded assets
+LOAD_BUDGET = 0.004
+
+# The menu screens are event driven: they sleep until input arrives, the
+# intro animation is due for its next frame or (while assets are still
+# loading) the loader needs polling, and only redraw and flip when something
+# on screen changed. A player sitting in a menu costs next to no CPU.
+LOAD_POLL_MS = 16
+REDRAW_EVENTS = {pygame.KEYDOWN, pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED, pygame.WINDOWSHOWN,
+                 pygame.WINDOWRESTORED, pygame.WINDOWSIZECHANGED}
+
+# Events that arrive within timeout ms, waiting for the first one; None waits
+# as long as it takes. The browser cannot block, so there the wait is an
+# asyncio sleep that hands control back to it.
+async def menu_events(timeout=None):
+    if sys.platform == "emscripten":
+        await asyncio.sleep((timeout if timeout is not None else 50) / 1000)
+        return pygame.event.get()
+    event = pygame.event.wait(max(1, timeout) if timeout is not None else 0)
+    events = [] if event.type == pygame.NOEVENT else [event]
+    events += pygame.event.get()
+    await asyncio.sleep(0)
+    return events
+
+# The animated intro background behind the intro and name screens. Its
+# frames are streamed from the GIF by a GifStream, each shown for as long as
+# the GIF says, and the stream is closed when a game starts, so no intro frame
+# is held in memory during play. It is opened again for the next intro.
+INTRO_GIF = os.path.join(assets_folder, "intro_background.gif")
+# How the streamed frames are stored: "rgb" or "palette" (see gifstream.py)
+intro_storage = "rgb"
+# How soon to look again when the next frame is due but not decoded yet, in ms
+FRAME_POLL_MS = 10
+
+class IntroBackground:
+    def __init__(self, stream):
+        self.stream = stream
+        self.frame = None
+        self.duration = 0
+        self.last_change = pygame.time.get_ticks()
+
+    def _show(self, frame, now):
+        self.frame, self.duration = frame
+        self.last_change = now
+
+    # Block briefly for the first frame, so the intro does not open on black
+    def wait_first_frame(self, timeout=1.0):
+        if self.stream is None or self.frame is not None:
+            return
+        frame = self.stream.wait_frame(timeout)
+        if frame is not None:
+            self._show(frame, pygame.time.get_ticks())
+            if "first_gif_frame_ms" not in startup_timings:
+                startup_timings["first_gif_frame_ms"] = (time.perf_counter() - STARTUP_TIME) * 1000
+
+    # Move to the next frame if it is due and decoded; True if the frame changed
+    def update(self, now):
+        if self.stream is None or now - self.last_change < self.duration:
+            return False
+        frame = self.stream.next_frame()
+        if frame is None:
+            return False
+        self._show(frame, now)
+        return True
+
+    # ms until the next frame is due, or None if there is no animation
+    def wait(self, now):
+        if self.stream is None or self.stream.finished:
+            return None
+        remaining = self.duration - (now - self.last_change)
+        return remaining if remaining > 0 else FRAME_POLL_MS
+
+    def draw(self):
+        screen.fill(BLACK)
+        if self.frame is not None:
+            screen.blit(self.frame, (0, 0))
+
+    def close(self):
+        if self.stream is None:
+            return
+        before = resident_memory()
+        stream = self.stream
+        stream.close()
+        self.stream = self.frame = None
+        after = resident_memory()
+        print(f"Closed intro background stream ({stream.decoded} frames decoded, buffer peak "
+              f"{megabytes(stream.peak_bytes)}), resident memory {megabytes(before)} -> {megabytes(after)}")
+
+intro_background = None
+
+def open_intro_background():
+    global intro_background
+    if intro_background is not None:
+        return intro_background
+    stream = None
+    try:
+        if os.path.exists(INTRO_GIF):
+            stream = GifStream(INTRO_GIF, (WIDTH, HEIGHT), storage=intro_storage,
+                               threaded=sys.platform != "emscripten")
+        else:
+            print(f"File {INTRO_GIF} not found, using fallback")
+    except Exception as e:
+        print(f"Error loading GIF {INTRO_GIF}: {e}, using fallback")
+    intro_background = IntroBackground(stream)
+    return intro_background
+
+def close_intro_background():
+    global intro_background
+    if intro_background is not None:
+        intro_background.close()
+        intro_background = None
+
+# Start decoding right away, so the intro can open on its first frame
+open_intro_background()
+
+# How long a menu may sleep: until the next animation frame, the next loader
+# poll or the given deadline, whichever comes first (None for no limit)
+def menu_timeout(background, now, deadline=None):
+    waits = [background.wait(now), None if loader.finished else LOAD_POLL_MS,
+             None if deadline is None else deadline - now]
+    waits = [wait for wait in waits if wait is not None]
+    return min(waits) if waits else None
+
+async def show_intro():
+    background = open_intro_background()
+    background.wait_first_frame()
+    narration_started = False
     
     intro_duration = 30000
     start_time = pygame.time.get_ticks()
     skipped = False
-    frame_index = 0
-    frame_delay = 100
-    last_frame_time = start_time
-    clock = pygame.time.Clock()
+    redraw = True
     
     while pygame.time.get_ticks() - start_time < intro_duration:
-        for event in pygame.event.get():
+        if not redraw:
+            now = pygame.time.get_ticks()
+            events = await menu_events(menu_timeout(background, now, start_time + intro_duration))
+        else:
+            events = pygame.event.get()
+        for event in events:
             if event.type == pygame.QUIT:
                 return False
             if event.type == pygame.KEYDOWN and not skipped:
                 if event.key == pygame.K_SPACE:
                     skipped = True
                     print("Intro screen skipped")
+            if event.type in REDRAW_EVENTS:
+                redraw = True
+        if loader.poll(budget=LOAD_BUDGET):
+            redraw = True
+        # Start the narration as soon as it has been decoded
+        if not narration_started and audio.has("narration"):
+            audio.play("narration")
+            narration_started = True
+            print("Intro narration started")
+        if background.update(pygame.time.get_ticks()):
+            redraw = True
+        if not redraw:
+            continue
         
-        screen.fill(BLACK)
-        if intro_gif_frames:
-            if pygame.time.get_ticks() - last_frame_time >= frame_delay:
-                frame_index = (frame_index + 1) % len(intro_gif_frames)
-                last_frame_time = pygame.time.get_ticks()
-            screen.blit(intro_gif_frames[frame_index], (0, 0))
-        else:
-            screen.fill(BLACK)
-        
+        background.draw()
         if not skipped:
-            skip_text = font.render("Press Space to Skip", True, WHITE)
+            skip_text = text_cache.render("Press Space to Skip", font, WHITE)
             screen.blit(skip_text, (WIDTH//2 - skip_text.get_width()//2, HEIGHT - 50))
         else:
-            prompt = font.render("Enter your name, Seedizen:", True, WHITE)
+            prompt = text_cache.render("Enter your name, Seedizen:", font, WHITE)
             screen.blit(prompt, (WIDTH//2 - prompt.get_width()//2, HEIGHT//2 - 40))
+        draw_loading_progress()
         
         pygame.display.flip()
-        clock.tick(60)
+        redraw = False
+        if "first_frame_ms" not in startup_timings:
+            startup_timings["first_frame_ms"] = (time.perf_counter() - STARTUP_TIME) * 1000
+            print(f"First intro frame shown after {startup_timings['first_frame_ms']:.0f} ms")
     
     print("Intro narration should have ended")
     return True
 
-def get_player_name():
+async def get_player_name():
     global player_name
     input_active = True
     player_name = ""
-    frame_index = 0
-    frame_delay = 100
-    last_frame_time = pygame.time.get_ticks()
-    clock = pygame.time.Clock()
+    background = open_intro_background()
+    redraw = True
     
     while input_active:
-        for event in pygame.event.get():
+        if not redraw:
+            events = await menu_events(menu_timeout(background, pygame.time.get_ticks()))
+        else:
+            events = pygame.event.get()
+        for event in events:
             if event.type == pygame.QUIT:
                 return False
             if event.type == pygame.KEYDOWN:
@@ -302,265 +590,294 @@ def get_player_name():
                     player_name = player_name[:-1]
                 else:
                     player_name += event.unicode
+            if event.type in REDRAW_EVENTS:
+                redraw = True
+        if loader.poll(budget=LOAD_BUDGET):
+            redraw = True
+        if background.update(pygame.time.get_ticks()):
+            redraw = True
+        if not redraw or not input_active:
+            continue
         
-        screen.fill(BLACK)
-        if intro_gif_frames:
-            if pygame.time.get_ticks() - last_frame_time >= frame_delay:
-                frame_index = (frame_index + 1) % len(intro_gif_frames)
-                last_frame_time = pygame.time.get_ticks()
-            screen.blit(intro_gif_frames[frame_index], (0, 0))
-        else:
-            screen.fill(BLACK)
-        prompt = font.render("Enter your name, Seedizen:", True, WHITE)
-        name_text = font.render(player_name, True, WHITE)
+        background.draw()
+        prompt = text_cache.render("Enter your name, Seedizen:", font, WHITE)
+        name_text = text_cache.render(player_name, font, WHITE)
         screen.blit(prompt, (WIDTH//2 - prompt.get_width()//2, HEIGHT//2 - 40))
         screen.blit(name_text, (WIDTH//2 - name_text.get_width()//2, HEIGHT//2))
+        draw_loading_progress()
         pygame.display.flip()
-        clock.tick(60)
+        redraw = False
     return True
 
-def show_end_screen(game_time):
+# Leaderboard lines for the end screen: the player's rank and the top scores
+def leaderboard_text(rank, count=5):
+    if leaderboard is None:
+        return None, []
+    if rank:
+        rank_line = f"Rank #{rank} of {leaderboard.runs} runs"
+    else:
+        rank_line = f"Outside the top {leaderboard.top_n} of {leaderboard.runs} runs"
+    top_lines = [f"{i}. {score.name or 'Anonymous'}  {score.game_time:.2f}s"
+                 for i, score in enumerate(leaderboard.top(count), 1)]
+    return rank_line, top_lines
+
+# ranked is False for runs kept off the leaderboard (co-op games), which
+# show no leaderboard lines
+async def show_end_screen(game_time, rank=None, ranked=True):
     play_again = False
-    clock = pygame.time.Clock()
+    rank_line, top_lines = leaderboard_text(rank) if ranked else (None, [])
+    redraw = True
     
     while not play_again:
-        for event in pygame.event.get():
+        # Nothing on this screen moves, so it sleeps until an event arrives
+        for event in (pygame.event.get() if redraw else await menu_events()):
             if event.type == pygame.QUIT:
                 return False
             if event.type == pygame.KEYDOWN:
                 if event.key == pygame.K_SPACE:
                     play_again = True
                     break
+            if event.type in REDRAW_EVENTS:
+                redraw = True
+        if not redraw or play_again:
+            continue
         
-        screen.fill(BLACK)
-        if end_bg:
-            scaled_end = pygame.transform.scale(end_bg, (WIDTH, HEIGHT))
-            screen.blit(scaled_end, (0, 0))
-        time_text = font.render(f"Time: {game_time:.2f}s", True, WHITE)
-        win_text = font.render(f"Congratulations, {player_name}! WAGMI!", True, WHITE)
-        play_again_text = font.render("Press Space to Play Again", True, WHITE)
+        draw_background("end_background")
+        time_text = text_cache.render(f"Time: {game_time:.2f}s", font, WHITE)
+        win_text = text_cache.render(f"Congratulations, {player_name}! WAGMI!", font, WHITE)
+        play_again_text = text_cache.render("Press Space to Play Again", font, WHITE)
         screen.blit(time_text, (WIDTH//2 - time_text.get_width()//2, HEIGHT//2 - 40))
         screen.blit(win_text, (WIDTH//2 - win_text.get_width()//2, HEIGHT//2))
-        screen.blit(play_again_text, (WIDTH//2 - play_again_text.get_width()//2, HEIGHT//2 + 40))
+        if rank_line:
+            rank_text = text_cache.render(rank_line, font, WHITE)
+            screen.blit(rank_text, (WIDTH//2 - rank_text.get_width()//2, HEIGHT//2 + 40))
+        for i, line in enumerate(top_lines):
+            top_text = text_cache.render(line, small_font, WHITE)
+            screen.blit(top_text, (WIDTH//2 - top_text.get_width()//2, 40 + i * 24))
+        screen.blit(play_again_text, (WIDTH//2 - play_again_text.get_width()//2, HEIGHT//2 + 100))
         pygame.display.flip()
-        clock.tick(60)
+        redraw = False
     return True
 
-# Main game loop
-clock = pygame.time.Clock()
-running = True
+# Sounds and log lines for the events of a step or co-op frame. Returns True
+# if the game ended.
+def play_events(events):
+    for event_name in events:
+        audio.play(event_sounds.get(event_name))
+        if event_name == "por":
+            print("POR power-up collected!")
+        elif event_name == "por_expired":
+            print("POR power-up expired")
+        elif event_name == "disconnected":
+            print("Lost the connection to the co-op server")
+    return "game_over" in events or "disconnected" in events
+
+# Join the co-op server at address (HOST[:PORT]), or return None to play alone
+# if that fails
+def join_coop(address):
+    try:
+        if CoopClient is None:
+            raise RuntimeError("networking is not available")
+        return CoopClient(parse_address(address), player_name, (state.player_width, state.player_height), state.sizes)
+    except Exception as e:
+        print(f"Error joining co-op game at {address}: {e}, playing alone")
+        return None
 
-while running:
-    reset_game()
-    show_intro_screen = True
-    game_over = False
+# Main game loop. The simulation runs in fixed steps (see game.FixedStep)
+# while frames are drawn as fast as --fps or vsync allow, interpolated
+# between the last two steps. In a co-op game (--connect) the server runs the
+# simulation instead: each step only sends the input and moves the local ship,
+# and the frame draws the CoopClient's copy of the server's game.
+#
+# The loop and every screen are coroutines that yield with
+# asyncio.sleep(0) once per frame. In the pygbag web build that hands control
+# back to the browser every frame; on the desktop, asyncio.run() drives them
+# the same way.
+async def main(argv=None):
+    global game_active, intro_storage
+    parser = argparse.ArgumentParser(description="Debt Blaster")
+    parser.add_argument("--renderer", choices=RENDERERS, default="full",
+                        help="redraw the whole screen every frame, only what changed, or draw with textures")
+    parser.add_argument("--fps", type=int, default=60, help="frame rate cap, 0 for uncapped")
+    parser.add_argument("--vsync", action="store_true", help="sync frames to the display refresh")
+    parser.add_argument("--overlay", action="store_true", help="start with the profiler overlay (F3) shown")
+    parser.add_argument("--trace", metavar="FILE", help="record per-frame timings and counts to a JSONL file")
+    parser.add_argument("--record", metavar="FILE", help="input replay file (default: a new one in replays/)")
+    parser.add_argument("--no-record", action="store_true", help="do not record an input replay")
+    parser.add_argument("--intro-storage", choices=STORAGE, default="rgb",
+                        help="keep streamed intro frames as 24-bit or palette surfaces")
+    parser.add_argument("--connect", metavar="HOST[:PORT]", help="join a co-op game on a netplay.py server")
+    args = parser.parse_args(argv)
+    if args.intro_storage != intro_storage:
+        intro_storage = args.intro_storage
+        close_intro_background()
+
+    if args.vsync:
+        try:
+            open_scaled_display(vsync=True)
+            print("Vsync enabled")
+        except Exception as e:
+            print(f"Error enabling vsync: {e}, using --fps instead")
 
-    while running and not game_over:
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                running = False
-            if event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_SPACE and game_active:
-                    if por_active:
-                        bullets.append(Bullet(player_x + player_width//2 - bullet_width//2, player_y, 0))
-                        bullets.append(Bullet(player_x + player_width//2 - bullet_width//2, player_y, -30))
-                        bullets.append(Bullet(player_x + player_width//2 - bullet_width//2, player_y, 30))
-                    else:
-                        bullets.append(Bullet(player_x + player_width//2 - bullet_width//2, player_y))
-                    if bullet_sound:
-                        bullet_sound.play()
-                    if not start_time:
-                        start_time = pygame.time.get_ticks()
-
-        if show_intro_screen:
-            try:
-                if not show_intro():
+    clock = pygame.time.Clock()
+    fixed_step = FixedStep()
+    last_frame = time.perf_counter()
+    pending_fire = 0
+    timer = FrameTimer(history=False)
+    pacing = FramePacing(args.fps or 60)
+    trace = TraceRecorder(args.trace) if args.trace else None
+    recorder = None
+    coop = None
+    playing = state
+    if args.overlay:
+        profiler_overlay.toggle()
+    running = True
+
+    while running:
+        reset_game()
+        show_intro_screen = True
+        game_over = False
+
+        while running and not game_over:
+            timer.begin_frame()
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
                     running = False
-                if not get_player_name():
+                if event.type == pygame.KEYDOWN:
+                    if event.key == pygame.K_SPACE and game_active:
+                        pending_fire += 1
+                    elif event.key == pygame.K_F3:
+                        profiler_overlay.toggle()
+
+            if show_intro_screen:
+                try:
+                    if not await show_intro():
+                        running = False
+                    if not await get_player_name():
+                        running = False
+                    close_intro_background()
+                    show_intro_screen = False
+                    finish_loading()
+                    coop = join_coop(args.connect) if args.connect else None
+                    playing = coop.state if coop else state
+                    # Every game gets its own seed, so its replay starts from a known state
+                    seed = int.from_bytes(os.urandom(8), "little")
+                    state.rng.seed(seed)
+                    if not args.no_record and not coop:
+                        try:
+                            if recorder is None:
+                                path = args.record or time.strftime("replays/session-%Y%m%d-%H%M%S.replay")
+                                recorder = ReplayRecorder(path, (state.player_width, state.player_height), state.sizes)
+                            recorder.start_game(seed)
+                        except Exception as e:
+                            print(f"Error recording replay: {e}, not recording")
+                            args.no_record = True
+                            recorder = None
+                    game_active = True
+                    # A fresh renderer, since the menus drew over the whole screen
+                    use_renderer(args.renderer)
+                    audio.stop("voice")
+                    if background_music_loaded:
+                        mixer.music.set_volume(0.5)
+                        mixer.music.play(-1)
+                    print("Intro completed")
+                except Exception as e:
+                    print(f"Error in intro: {e}")
                     running = False
-                show_intro_screen = False
-                game_active = True
-                if background_music_loaded:
-                    mixer.music.load(background_music)
-                    mixer.music.set_volume(0.5)
-                    mixer.music.play(-1)
-                print("Intro completed")
-            except Exception as e:
-                print(f"Error in intro: {e}")
-                running = False
-
-        if game_active and not game_over:
-            keys = pygame.key.get_pressed()
-            if keys[pygame.K_LEFT] and player_x > 0:
-                player_x -= player_speed
-            if keys[pygame.K_RIGHT] and player_x < WIDTH - player_width:
-                player_x += player_speed
-
-            enemy_timer += 1
-            if enemy_timer >= enemy_spawn_rate:
-                enemies.append(Enemy())
-                if random.random() < 0.1:
-                    superseeds.append(SuperSeed())
-                if random.random() < 0.15:
-                    loansharks.append(LoanShark())
-                if random.random() < 0.05:
-                    pors.append(POR())
-                enemy_timer = 0
-
-            if por_active:
-                current_time = pygame.time.get_ticks()
-                if (current_time - por_timer) >= 30000:
-                    por_active = False
-                    print("POR power-up expired")
-
-            for bullet in bullets[:]:
-                bullet.update()
-                if bullet.y < -bullet_height or bullet.x < 0 or bullet.x > WIDTH:
-                    bullets.remove(bullet)
-
-            for enemy in enemies[:]:
-                enemy.y += enemy.speed
-                if enemy.y > HEIGHT:
-                    enemies.remove(enemy)
-
-            for seed in superseeds[:]:
-                seed.y += seed.speed
-                if seed.y > HEIGHT:
-                    superseeds.remove(seed)
-
-            for shark in loansharks[:]:
-                shark.y += shark.speed
-                if shark.y > HEIGHT:
-                    loansharks.remove(shark)
-
-            for por in pors[:]:
-                por.y += por.speed
-                if por.y > HEIGHT:
-                    pors.remove(por)
-
-            for notification in notifications[:]:
-                if notification.is_expired():
-                    notifications.remove(notification)
-
-            for bullet in bullets[:]:
-                bullet_rect = pygame.Rect(bullet.x, bullet.y, bullet_width, bullet_height)
-                
-                for enemy in enemies[:]:
-                    enemy_rect = pygame.Rect(enemy.x, enemy.y, enemy_width, enemy_height)
-                    if bullet_rect.colliderect(enemy_rect):
-                        debt -= 10
-                        enemies.remove(enemy)
-                        bullets.remove(bullet)
-                        if hit_sound:
-                            hit_sound.play()
-                        break
-
-                for seed in superseeds[:]:
-                    seed_rect = pygame.Rect(seed.x, seed.y, superseed_width, superseed_height)
-                    if bullet_rect.colliderect(seed_rect):
-                        debt = math.ceil(debt * 0.99)
-                        superseeds.remove(seed)
-                        bullets.remove(bullet)
-                        if powerup_sound:
-                            powerup_sound.play()
-                        break
-
-                for shark in loansharks[:]:
-                    shark_rect = pygame.Rect(shark.x, shark.y, loanshark_width, loanshark_height)
-                    if bullet_rect.colliderect(shark_rect):
-                        debt = math.ceil(debt * 1.10)
-                        loansharks.remove(shark)
-                        bullets.remove(bullet)
-                        notifications.append(Notification("Loan shark increased your debt by 10%"))
-                        if penalty_sound:
-                            penalty_sound.play()
-                        break
-
-                for por in pors[:]:
-                    por_rect = pygame.Rect(por.x, por.y, por_width, por_height)
-                    if bullet_rect.colliderect(por_rect):
-                        debt = math.ceil(debt * 0.98)
-                        por_active = True
-                        por_timer = pygame.time.get_ticks()
-                        pors.remove(por)
-                        bullets.remove(bullet)
-                        notifications.append(Notification("2% of your debt has been paid with POR"))
-                        if por_sound:
-                            por_sound.play()
-                        print("POR power-up collected!")
+                # Time spent in the menus is not game time
+                fixed_step.reset()
+                last_frame = time.perf_counter()
+                pending_fire = 0
+                pacing.pause()
+                timer.begin_frame()
+            timer.lap("events")
+
+            now = time.perf_counter()
+            steps = fixed_step.advance(now - last_frame)
+            last_frame = now
+
+            frame_events = []
+            if game_active and not game_over:
+                keys = pygame.key.get_pressed()
+                for _ in range(steps):
+                    # Presses since the last step all go to the next one
+                    inputs = Inputs(keys[pygame.K_LEFT], keys[pygame.K_RIGHT], pending_fire)
+                    pending_fire = 0
+                    if coop:
+                        events = coop.send_inputs(inputs)
+                    else:
+                        if recorder:
+                            recorder.record(inputs)
+                        events = step(state, inputs, timer)
+                        update_particles(state)
+                        timer.lap("particles")
+                    frame_events += events
+                    game_over = play_events(events)
+                    if game_over:
                         break
-
-            if debt < 8000:
-                enemy_speed = 2.5
-            if debt < 5000:
-                enemy_speed = 3
-                enemy_spawn_rate = 50
-
-            if debt <= 0:
-                debt = 0
-                game_over = True
-                end_time = pygame.time.get_ticks()
-                game_time = (end_time - start_time) / 1000
-                if background_music_loaded:
-                    mixer.music.stop()
-
-        screen.fill(BLACK)
-        if background_img:
-            scaled_bg = pygame.transform.scale(background_img, (WIDTH, HEIGHT))
-            screen.blit(scaled_bg, (0, 0))
-        
-        if game_active:
-            if player_img:
-                screen.blit(player_img, (player_x, player_y))
+                if coop and not game_over:
+                    events = coop.update()
+                    timer.lap("network")
+                    update_particles(playing, steps)
+                    timer.lap("particles")
+                    frame_events += events
+                    game_over = play_events(events)
+                if game_over:
+                    if recorder and not coop:
+                        recorder.end_game(state.game_time)
+                    if background_music_loaded:
+                        mixer.music.stop()
+
+            if game_active:
+                present(draw_game(playing, timer, 1.0 if game_over else fixed_step.alpha))
+                timer.lap("flip")
+                pacing.tick(timer.last)
+                timer.end_frame()
+                if profiler_overlay.visible or trace:
+                    counts = live_counts(playing)
+                    profiler_overlay.update(timer.current, clock.get_fps(), list(zip(COUNT_LABELS, counts)),
+                                            last_frame)
+                    if trace:
+                        trace.record(timer.current, counts, frame_events)
+
+                if game_over:
+                    print(pacing.report())
+                    pacing.reset()
+                    rank = None
+                    if coop:
+                        coop.close()
+                    elif leaderboard:
+                        rank = leaderboard.add(player_name, state.game_time)
+                    # A co-op game cut short by the server going away has no end screen
+                    if (playing.game_time is not None and
+                            not await show_end_screen(playing.game_time, rank, ranked=coop is None)):
+                        running = False
+                    else:
+                        reset_game()
+                        show_intro_screen = True
+                        game_over = False
             else:
-                pygame.draw.rect(screen, GREEN, (player_x, player_y, player_width, player_height))
-            
-            for bullet in bullets:
-                if bullet_img:
-                    screen.blit(bullet_img, (bullet.x, bullet.y))
-                else:
-                    pygame.draw.rect(screen, WHITE, (bullet.x, bullet.y, bullet_width, bullet_height))
-            
-            for enemy in enemies:
-                if enemy_img:
-                    screen.blit(enemy_img, (enemy.x, enemy.y))
-                else:
-                    pygame.draw.rect(screen, RED, (enemy.x, enemy.y, enemy_width, enemy_height))
-            
-            for seed in superseeds:
-                if superseed_img:
-                    screen.blit(superseed_img, (seed.x, seed.y))
-                else:
-                    pygame.draw.rect(screen, YELLOW, (seed.x, seed.y, superseed_width, superseed_height))
-            
-            for shark in loansharks:
-                if loanshark_img:
-                    screen.blit(loanshark_img, (shark.x, shark.y))
-                else:
-                    pygame.draw.rect(screen, GRAY, (shark.x, shark.y, loanshark_width, loanshark_height))
-            
-            for por in pors:
-                if por_img:
-                    screen.blit(por_img, (por.x, por.y))
-                else:
-                    pygame.draw.rect(screen, PURPLE, (por.x, por.y, por_width, por_height))
-            
-            render_text_with_outline(f"Debt: ${debt}", font, WHITE, BLACK, (10, 10))
-            
-            for i, notification in enumerate(notifications):
-                render_text_with_outline(notification.text, font, WHITE, BLACK, (WIDTH//2 - len(notification.text)*10, HEIGHT//2 + i*40))
-            
-            if game_over:
-                if not show_end_screen(game_time):
-                    running = False
-                else:
-                    reset_game()
-                    show_intro_screen = True
-                    game_over = False
+                present()
         
-        pygame.display.flip()
-        clock.tick(60)
-
-pygame.quit()
-print("Game closed normally")
-sys.exit(0)
\ No newline at end of file
+            clock.tick(0 if args.vsync else args.fps)
+            await asyncio.sleep(0)
+
+    if pacing.intervals:
+        print(pacing.report())
+    print(audio.report())
+    print(particles.report())
+    if leaderboard:
+        leaderboard.close()
+    if coop:
+        coop.close()
+    if trace:
+        trace.close()
+    if recorder:
+        recorder.close()
+    wait_for_build()
+    pygame.quit()
+    print("Game closed normally")
+    sys.exit(0)
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,802 @@
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import platform
+import select
+import selectors
+import socket
+import struct
+import time
+from collections import deque, namedtuple
+import numpy as np
+from balance import distribution
+from entities import ENEMY, SUPERSEED, LOANSHARK, POR
+from game import (DEFAULT_SIZES, NO_INPUT, PLAYER_SIZE, POLICIES, STARTING_DEBT, STEP, TICK_RATE,
+                  GameState, Notification, keep_swarm, move_ship, step)
+from perf import FrameTimer, git_revision
+from replay import decode_inputs, encode_inputs
+
+# Two-player co-op over the network. A server process runs the one true
+# GameState at the fixed TICK_RATE, with a ship per player and a single debt
+# they pay off together, and sends every client a snapshot of the game every
+# SEND_EVERY ticks. Clients only send their inputs, one message per step.
+#
+# Everything goes over TCP (with Nagle off), as length-prefixed binary
+# messages:
+#
+#   H sizes name      client hello: its hitbox sizes and player name
+#   W slot ...        server welcome: the client's ship, the number of ships
+#                     and the sizes the server plays with
+#   I seq input       one step of input, numbered, packed as in replay.py
+#   S snapshot        tick, debt, flags, every ship's x with the last input
+#                     applied for it, then the entity delta, the hits and the
+#                     notifications since the last snapshot
+#
+# Snapshots are delta compressed. Both ends keep an entity table: per entity
+# its spawn serial, kind, a quantized position and velocity (quarter pixels,
+# 1/128 pixel per step) and the tick that position is from. Entities move in
+# straight lines, so the table knows where each one is at any tick, and a
+# snapshot only carries the serials that are gone and a 15-byte record for
+# each entity that is new or has strayed more than RESEND_ERROR pixels from
+# where the table puts it. A falling moneybag costs its 15 bytes once, however
+# long it falls. A client that joins late, or was not in sync, gets the whole
+# table once instead. TCP delivers every snapshot in order, so the server can
+# take the delta against the last snapshot it sent.
+#
+# A client draws the game INTERP_DELAY ticks behind the newest snapshot, so
+# there are snapshots either side of what it draws: entities are placed from
+# the table at that fractional tick and the other ship is interpolated between
+# the two snapshots around it. Its own ship it moves at once, predicting with
+# game.move_ship, and when a snapshot says which of its inputs the server has
+# applied, it starts again from the server's x and replays the ones still in
+# flight.
+#
+# Usage: python netplay.py server [--port P] [--players N] [--swarm N]
+#        python netplay.py bench [--seconds S] [--swarm N ...] [--output FILE]
+#        python main.py --connect HOST[:PORT]
+
+DEFAULT_PORT = 5151
+
+# Snapshots go out every SEND_EVERY ticks (20 a second) and are drawn
+# INTERP_DELAY ticks late
+SEND_EVERY = 3
+INTERP_DELAY = 2 * SEND_EVERY
+
+POSITION_SCALE = 4
+VELOCITY_SCALE = 128
+RESEND_ERROR = 0.5
+MAX_AGE = 65535
+
+# Inputs a client may get ahead of the server by before the extras are merged
+MAX_QUEUED_INPUTS = 6
+# A client whose unsent snapshots pile up past this is dropped
+MAX_OUTGOING = 4 * 2**20
+# After a stall the server skips the ticks it missed rather than racing
+MAX_LAG = 0.25
+
+LENGTH = struct.Struct("<I")
+HELLO = struct.Struct("<c12H")
+WELCOME = struct.Struct("<cBBB12H")
+INPUT = struct.Struct("<cIB")
+SNAPSHOT = struct.Struct("<cIqdBBIIIHB")
+SHIP = struct.Struct("<dI")
+
+RECORD = np.dtype([("serial", "<u4"), ("kind", "u1"), ("x", "<i2"), ("y", "<i2"),
+                   ("vx", "<i2"), ("vy", "<i2"), ("age", "<u2")])
+HIT = np.dtype([("age", "u1"), ("kind", "u1"), ("x", "<i2"), ("y", "<i2")])
+SERIAL = np.dtype("<u4")
+
+# Snapshot flags
+FULL = 1
+GAME_OVER = 2
+POR_ACTIVE = 4
+
+# Events a client reports for the hits it draws, as step() would
+HIT_EVENTS = {ENEMY: "hit", SUPERSEED: "powerup", LOANSHARK: "penalty", POR: "por"}
+
+def quantize(values, scale):
+    return np.clip(np.rint(values * scale), -32768, 32767).astype(np.int16)
+
+def flatten_sizes(player_size, sizes):
+    return [*player_size, *[n for size in sizes for n in size]]
+
+def unflatten_sizes(values):
+    return tuple(values[:2]), [tuple(values[i:i + 2]) for i in range(2, len(values), 2)]
+
+# Entities as a client knows them: a RECORD per entity (its age unused) and
+# the tick its position is from
+class EntityTable:
+    def __init__(self, records=None, anchors=None):
+        self.records = np.zeros(0, RECORD) if records is None else records
+        self.anchors = np.zeros(0, np.int64) if anchors is None else anchors
+
+    def __len__(self):
+        return len(self.records)
+
+    # Where every entity is at tick, which may be fractional
+    def positions(self, tick):
+        records = self.records
+        age = tick - self.anchors
+        return (records["x"] / POSITION_SCALE + records["vx"] / VELOCITY_SCALE * age,
+                records["y"] / POSITION_SCALE + records["vy"] / VELOCITY_SCALE * age)
+
+    # The table after a snapshot at tick removed some serials and sent records
+    def apply(self, tick, removed, records):
+        serial = self.records["serial"]
+        keep = ~(np.isin(serial, removed) | np.isin(serial, records["serial"]))
+        return EntityTable(np.concatenate((self.records[keep], records)),
+                           np.concatenate((self.anchors[keep], tick - records["age"].astype(np.int64))))
+
+    # Every entity as records, for a client starting from nothing
+    def full_records(self, tick):
+        records = self.records.copy()
+        records["age"] = tick - self.anchors
+        return records
+
+# What a snapshot at tick has to send for a table to match the entity store:
+# the serials that are gone and a record for every entity that is new or not
+# where the table puts it
+def diff(table, entities, tick):
+    n = entities.count
+    serial = entities.serial[:n]
+    x = entities.x[:n]
+    y = entities.y[:n]
+    vx = quantize(entities.vx[:n], VELOCITY_SCALE)
+    vy = quantize(entities.vy[:n], VELOCITY_SCALE)
+    known = table.records["serial"].astype(np.int64)
+    if len(known):
+        order = np.argsort(known)
+        rows = order[np.minimum(np.searchsorted(known, serial, sorter=order), len(known) - 1)]
+        table_x, table_y = table.positions(tick)
+        records = table.records[rows]
+        stale = ((known[rows] != serial) | (records["vx"] != vx) | (records["vy"] != vy)
+                 | (np.abs(table_x[rows] - x) > RESEND_ERROR) | (np.abs(table_y[rows] - y) > RESEND_ERROR)
+                 | (tick - table.anchors[rows] >= MAX_AGE))
+        removed = known[~np.isin(known, serial)].astype(SERIAL)
+    else:
+        stale = np.ones(n, dtype=bool)
+        removed = np.zeros(0, SERIAL)
+    sent = np.zeros(int(np.count_nonzero(stale)), RECORD)
+    sent["serial"] = serial[stale]
+    sent["kind"] = entities.kind[:n][stale]
+    sent["x"] = quantize(x[stale], POSITION_SCALE)
+    sent["y"] = quantize(y[stale], POSITION_SCALE)
+    sent["vx"] = vx[stale]
+    sent["vy"] = vy[stale]
+    return removed, sent
+
+def encode_snapshot(tick, state, ships, table_size, removed, records, hits, notes, full=False):
+    flags = (FULL if full else 0) | (GAME_OVER if state.game_over else 0) | (POR_ACTIVE if state.por_active else 0)
+    game_time = state.game_time if state.game_over else -1.0
+    notes = [note.encode()[:255] for note in notes]
+    parts = [SNAPSHOT.pack(b"S", tick, state.debt, game_time, flags, len(ships), table_size,
+                           len(removed), len(records), len(hits), len(notes))]
+    parts += [SHIP.pack(x, acked) for x, acked in ships]
+    parts += [removed.tobytes(), records.tobytes(), hits.tobytes()]
+    for note in notes:
+        parts += [bytes((len(note),)), note]
+    return b"".join(parts)
+
+Snapshot = namedtuple("Snapshot", "tick table ships debt game_time flags")
+
+def decode_snapshot(message):
+    _, tick, debt, game_time, flags, players, table_size, removed, records, hits, notes = SNAPSHOT.unpack_from(message)
+    pos = SNAPSHOT.size
+    ships = [SHIP.unpack_from(message, pos + i * SHIP.size) for i in range(players)]
+    pos += players * SHIP.size
+    removed = np.frombuffer(message, SERIAL, removed, pos)
+    pos += removed.nbytes
+    records = np.frombuffer(message, RECORD, records, pos)
+    pos += records.nbytes
+    hits = np.frombuffer(message, HIT, hits, pos)
+    pos += hits.nbytes
+    texts = []
+    for _ in range(notes):
+        length = message[pos]
+        texts.append(message[pos + 1:pos + 1 + length].decode(errors="replace"))
+        pos += 1 + length
+    return tick, debt, game_time, flags, ships, table_size, removed, records, hits, texts
+
+# Bytes counted per wall-clock second
+class Traffic:
+    def __init__(self):
+        self.seconds = []
+        self.second = None
+        self.current = 0
+
+    def add(self, size, now):
+        second = int(now)
+        if self.second is None:
+            self.second = second
+        while second > self.second:
+            self.seconds.append(self.current)
+            self.current = 0
+            self.second += 1
+        self.current += size
+
+    # kB per second over the whole seconds, leaving out the first, which only
+    # counts from when the traffic started
+    def kilobytes(self):
+        return [size / 1000 for size in self.seconds[1:]]
+
+# Length-prefixed messages over a non-blocking socket. send() queues a
+# message and sends what the socket takes; the rest goes out on later
+# flush() calls. sent and received count message bytes, not TCP/IP headers.
+class Channel:
+    def __init__(self, sock):
+        sock.setblocking(False)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.sock = sock
+        self.incoming = bytearray()
+        self.outgoing = bytearray()
+        self.sent = 0
+        self.received = 0
+        self.closed = False
+
+    def send(self, message):
+        self.outgoing += LENGTH.pack(len(message))
+        self.outgoing += message
+        self.flush()
+
+    def flush(self):
+        while self.outgoing and not self.closed:
+            try:
+                sent = self.sock.send(self.outgoing)
+            except BlockingIOError:
+                break
+            except OSError:
+                self.closed = True
+                break
+            del self.outgoing[:sent]
+            self.sent += sent
+
+    # Every whole message that has arrived
+    def receive(self):
+        while not self.closed:
+            try:
+                data = self.sock.recv(65536)
+            except BlockingIOError:
+                break
+            except OSError:
+                data = b""
+            if not data:
+                self.closed = True
+                break
+            self.incoming += data
+            self.received += len(data)
+        messages = []
+        pos = 0
+        while len(self.incoming) - pos >= LENGTH.size:
+            size = LENGTH.unpack_from(self.incoming, pos)[0]
+            if len(self.incoming) - pos - LENGTH.size < size:
+                break
+            messages.append(bytes(self.incoming[pos + LENGTH.size:pos + LENGTH.size + size]))
+            pos += LENGTH.size + size
+        del self.incoming[:pos]
+        return messages
+
+    # Send what is still queued (for up to a second) and close
+    def close(self):
+        if not self.closed and self.outgoing:
+            try:
+                self.sock.settimeout(1.0)
+                self.sock.sendall(self.outgoing)
+            except OSError:
+                pass
+        self.closed = True
+        self.sock.close()
+
+# A client as the server sees it
+class Player:
+    def __init__(self, channel):
+        self.channel = channel
+        self.slot = None
+        self.name = None
+        self.inputs = deque()
+        self.held = NO_INPUT
+        self.acked = 0
+        self.synced = False
+        self.left = False
+        self.traffic = Traffic()
+
+    # The input for this tick. A client running behind keeps its keys held
+    # until its input arrives; one running ahead has its oldest inputs merged.
+    def next_input(self):
+        if not self.inputs:
+            return self.held._replace(fire=0)
+        seq, inputs = self.inputs.popleft()
+        while len(self.inputs) > MAX_QUEUED_INPUTS:
+            seq, later = self.inputs.popleft()
+            inputs = later._replace(fire=inputs.fire + later.fire)
+        self.acked = seq
+        self.held = inputs
+        return inputs
+
+# The authoritative co-op server. A game starts once every slot has a player
+# and ends when the debt is paid off, which closes every connection, or when
+# everyone has left. A player who drops out mid-game leaves their ship idle
+# until someone takes the slot. With swarm set, that many moneybags and sharks
+# are kept falling and the debt never runs out; with once, the server stops
+# after its first game. measure keeps per-tick timings for summary().
+class CoopServer:
+    def __init__(self, host="127.0.0.1", port=DEFAULT_PORT, players=2, seed=None, swarm=0, once=False, measure=False):
+        self.listener = socket.create_server((host, port))
+        self.listener.setblocking(False)
+        self.address = self.listener.getsockname()
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(self.listener, selectors.EVENT_READ)
+        self.slots = [None] * players
+        self.seed = seed
+        self.swarm = swarm
+        self.once = once
+        self.measure = measure
+        self.state = None
+        self.table = EntityTable()
+        self.playing = False
+        self.running = True
+        self.games = 0
+        self.hits = []
+        self.notes = []
+        self.timer = FrameTimer(history=measure)
+        self.traffic = []
+        self.delta_bytes = []
+        self.full_bytes = []
+        self.live = 0
+
+    def _accept(self):
+        try:
+            sock, _ = self.listener.accept()
+        except BlockingIOError:
+            return
+        player = Player(Channel(sock))
+        self.selector.register(sock, selectors.EVENT_READ, player)
+
+    def _read(self, player):
+        for message in player.channel.receive():
+            tag = message[:1]
+            if tag == b"I" and player.slot is not None:
+                _, seq, byte = INPUT.unpack(message)
+                player.inputs.append((seq, decode_inputs(byte)))
+            elif tag == b"H" and player.slot is None:
+                self._join(player, message)
+            if player.left:
+                return
+        if player.channel.closed:
+            self._leave(player)
+
+    def _join(self, player, message):
+        if None not in self.slots:
+            print("A player tried to join a full game")
+            self._leave(player)
+            return
+        slot = self.slots.index(None)
+        if self.state is None:
+            # Hitboxes come from the first player's sprites
+            player_size, sizes = unflatten_sizes(HELLO.unpack_from(message)[1:])
+            self.state = GameState(self.seed, player_size=player_size, sizes=sizes, players=len(self.slots))
+        state = self.state
+        player.slot = slot
+        player.name = message[HELLO.size:].decode(errors="replace")[:32] or f"Player {slot + 1}"
+        self.slots[slot] = player
+        self.traffic.append(player.traffic)
+        player.channel.send(WELCOME.pack(b"W", slot, len(self.slots), SEND_EVERY,
+                                         *flatten_sizes((state.player_width, state.player_height), state.sizes)))
+        joined = len(self.slots) - self.slots.count(None)
+        print(f"{player.name} joined as player {slot + 1} ({joined}/{len(self.slots)})")
+        if not self.playing and joined == len(self.slots):
+            self._start()
+
+    # Drop a player's connection. Safe to call again for one already gone.
+    def _leave(self, player):
+        if player.left:
+            return
+        player.left = True
+        self.selector.unregister(player.channel.sock)
+        player.channel.close()
+        if player.slot is None:
+            return
+        self.slots[player.slot] = None
+        player.slot = None
+        print(f"{player.name} left")
+        if self.playing and self.slots.count(None) == len(self.slots):
+            print("Everyone left, game abandoned")
+            self._end()
+
+    def _start(self):
+        state = self.state
+        seed = self.seed + self.games if self.seed is not None else int.from_bytes(os.urandom(8), "little")
+        state.rng.seed(seed)
+        state.reset()
+        self.table = EntityTable()
+        self.hits = []
+        self.notes = []
+        self.playing = True
+        print(f"Game {self.games + 1} started (seed {seed})")
+
+    def _end(self):
+        self.playing = False
+        self.games += 1
+        for player in self.slots:
+            if player:
+                self._leave(player)
+        if self.once:
+            self.running = False
+
+    def _tick(self):
+        state = self.state
+        timer = self.timer
+        timer.begin_frame()
+        inputs = [player.next_input() if player else NO_INPUT for player in self.slots]
+        if self.swarm:
+            keep_swarm(state, self.swarm)
+        timer.lap("inputs")
+        step(state, inputs, timer)
+        self.hits += [(state.frame, kind, x, y) for kind, x, y in state.hits]
+        self.notes += [notification.text for notification in state.notifications
+                       if notification.start_time == state.time]
+        if self.swarm and state.debt < STARTING_DEBT // 2:
+            state.debt = STARTING_DEBT
+        if state.frame % SEND_EVERY == 0 or state.game_over:
+            self._send_snapshot(timer)
+        timer.end_frame()
+        self.live += state.entities.count
+        if state.game_over:
+            print(f"Game over: debt paid off in {state.game_time:.2f}s")
+            self._end()
+
+    def _send_snapshot(self, timer):
+        state = self.state
+        tick = state.frame
+        removed, records = diff(self.table, state.entities, tick)
+        self.table = table = self.table.apply(tick, removed, records)
+        hits = np.array([(tick - hit_tick, kind, round(x), round(y)) for hit_tick, kind, x, y in self.hits], HIT)
+        ships = [(x, player.acked if player else 0) for x, player in zip(state.ship_x, self.slots)]
+        delta = encode_snapshot(tick, state, ships, len(table), removed, records, hits, self.notes)
+        self.hits = []
+        full = None
+        timer.lap("encode")
+
+        now = time.perf_counter()
+        for player in list(self.slots):
+            # Dropping a player can end the game and drop the rest
+            if player is None or player.left:
+                continue
+            message = delta
+            if not player.synced:
+                if full is None:
+                    full = encode_snapshot(tick, state, ships, len(table), removed[:0], table.full_records(tick),
+                                           hits, self.notes, full=True)
+                message = full
+                player.synced = True
+            player.channel.send(message)
+            player.traffic.add(LENGTH.size + len(message), now)
+            if len(player.channel.outgoing) > MAX_OUTGOING:
+                print(f"{player.name} is not keeping up with the snapshots, dropping them")
+                self._leave(player)
+        self.notes = []
+        if self.measure:
+            self.delta_bytes.append(len(delta))
+            self.full_bytes.append(len(delta) - removed.nbytes - records.nbytes + table.records.nbytes)
+        timer.lap("send")
+
+    def run(self, seconds=None):
+        host, port = self.address[:2]
+        print(f"Co-op server listening on {host}:{port} for {len(self.slots)} players")
+        next_tick = time.perf_counter()
+        end = next_tick + seconds if seconds else None
+        try:
+            while self.running and (end is None or time.perf_counter() < end):
+                timeout = max(0.0, next_tick - time.perf_counter()) if self.playing else 0.1
+                for key, _ in self.selector.select(timeout):
+                    if key.data is None:
+                        self._accept()
+                    else:
+                        self._read(key.data)
+                now = time.perf_counter()
+                if not self.playing:
+                    next_tick = now
+                elif now >= next_tick:
+                    self._tick()
+                    next_tick += STEP
+                    if now - next_tick > MAX_LAG:
+                        next_tick = now
+                for player in self.slots:
+                    if player and player.channel.outgoing:
+                        player.channel.flush()
+        except KeyboardInterrupt:
+            print("Server stopped")
+        finally:
+            self.close()
+
+    def close(self):
+        for player in self.slots:
+            if player:
+                self._leave(player)
+        self.selector.close()
+        self.listener.close()
+
+    def summary(self):
+        ticks = self.timer.frames
+        return {
+            "ticks": ticks,
+            "games": self.games,
+            "mean_live_entities": round(self.live / ticks, 1) if ticks else 0,
+            "tick_ms": self.timer.summary(),
+            "kb_per_second_per_client": distribution([kb for traffic in self.traffic for kb in traffic.kilobytes()]),
+            "snapshot_bytes": {"delta": distribution(self.delta_bytes), "full": distribution(self.full_bytes)},
+        }
+
+# A co-op player's end of the connection. state is a GameState mirroring the
+# server's game as of what is being drawn, with this player's ship first, for
+# main.py to draw like a local game (and for bots to play with the policies
+# from game.py). Each step, send_inputs() sends the step's input and moves the
+# local ship; each frame, update() takes in the snapshots that arrived and
+# brings state up to the drawn tick.
+class CoopClient:
+    def __init__(self, address, name, player_size=PLAYER_SIZE, sizes=DEFAULT_SIZES, timeout=5.0, measure=False):
+        self.channel = Channel(socket.create_connection(address, timeout))
+        self.channel.send(HELLO.pack(b"H", *flatten_sizes(player_size, sizes)) + name.encode()[:32])
+        self.backlog = []
+        welcome = None
+        deadline = time.perf_counter() + timeout
+        while welcome is None:
+            remaining = deadline - time.perf_counter()
+            if self.channel.closed or remaining <= 0:
+                self.channel.close()
+                raise ConnectionError("no welcome from the server (is the game full?)")
+            select.select([self.channel.sock], [], [], remaining)
+            for message in self.channel.receive():
+                if welcome is None and message[:1] == b"W":
+                    welcome = WELCOME.unpack(message)
+                else:
+                    self.backlog.append(message)
+        _, self.slot, players, send_every, *server_sizes = welcome
+        self.delay = 2 * send_every
+        player_size, sizes = unflatten_sizes(server_sizes)
+        self.state = GameState(player_size=player_size, sizes=sizes, players=players)
+        # Mirror ship order: this player's ship, then the others by slot
+        self.order = [self.slot] + [slot for slot in range(players) if slot != self.slot]
+        self.state.notifications = [Notification("Waiting for another player", 0.0, math.inf)]
+        self.table = EntityTable()
+        self.snapshots = deque(maxlen=TICK_RATE // send_every + 1)
+        self.hits = deque()
+        self.notes = deque()
+        self.offset = None
+        self.seq = 0
+        self.pending = deque()
+        self.predicted_x = None
+        self.previous_x = None
+        self.lost = False
+        self.timer = FrameTimer(history=measure)
+        self.traffic = Traffic()
+        self.counted = 0
+        self.received_snapshots = 0
+        self.corrections = []
+        self.starved = 0
+        print(f"Joined co-op game at {address[0]}:{address[1]} as player {self.slot + 1}")
+
+    @property
+    def started(self):
+        return self.predicted_x is not None
+
+    # Send one step of input and move the local ship for it. Returns the
+    # events to play straight away ("fire" per shot).
+    def send_inputs(self, inputs):
+        if not self.started or self.channel.closed:
+            return []
+        self.seq += 1
+        self.channel.send(INPUT.pack(b"I", self.seq, encode_inputs(inputs)))
+        self.pending.append((self.seq, inputs))
+        state = self.state
+        self.previous_x = self.predicted_x
+        self.predicted_x = move_ship(self.predicted_x, inputs, state.player_speed, state.player_width)
+        state.frame += 1
+        return ["fire"] * inputs.fire
+
+    def _snapshot(self, message, now):
+        tick, debt, game_time, flags, ships, table_size, removed, records, hits, notes = decode_snapshot(message)
+        self.table = (EntityTable() if flags & FULL else self.table).apply(tick, removed, records)
+        if len(self.table) != table_size:
+            print(f"Co-op snapshot {tick} left {len(self.table)} entities, the server has {table_size}")
+        self.snapshots.append(Snapshot(tick, self.table, ships, debt, game_time, flags))
+        self.hits.extend((tick - age, kind, x, y) for age, kind, x, y in hits.tolist())
+        self.notes.extend((tick, text) for text in notes)
+        self.received_snapshots += 1
+
+        # Server ticks run this far ahead of local time; a snapshot that comes
+        # in early moves the estimate up at once, late ones only drag it down
+        # slowly, so one slow packet does not make the game jump back
+        offset = tick - now * TICK_RATE
+        if self.offset is None or offset > self.offset:
+            self.offset = offset
+        else:
+            self.offset += (offset - self.offset) * 0.05
+
+        # Start the local ship again from where the server has it and replay
+        # the inputs it has not applied yet
+        x, acked = ships[self.slot]
+        while self.pending and self.pending[0][0] <= acked:
+            self.pending.popleft()
+        state = self.state
+        for _, inputs in self.pending:
+            x = move_ship(x, inputs, state.player_speed, state.player_width)
+        if self.predicted_x is None:
+            self.previous_x = x
+            state.notifications = []
+        elif abs(x - self.predicted_x) > 0.01:
+            self.corrections.append(abs(x - self.predicted_x))
+        self.predicted_x = x
+
+    # Take in the snapshots that arrived and bring state to the tick being
+    # drawn. Returns the events of the hits that came into view, and
+    # "game_over" when the last snapshot does or "disconnected" if the
+    # connection dropped without one. state.hits holds the new hits.
+    def update(self, now=None):
+        now = time.perf_counter() if now is None else now
+        timer = self.timer
+        timer.begin_frame()
+        messages = self.backlog + self.channel.receive()
+        self.backlog = []
+        self.traffic.add(self.channel.received - self.counted, now)
+        self.counted = self.channel.received
+        timer.lap("receive")
+        for message in messages:
+            if message[:1] == b"S":
+                self._snapshot(message, now)
+        timer.lap("decode")
+        events = self._interpolate(now) if self.snapshots else []
+        state = self.state
+        if self.channel.closed and not state.game_over and not self.lost:
+            newest = self.snapshots[-1] if self.snapshots else None
+            if newest is None or not newest.flags & GAME_OVER:
+                self.lost = True
+                events.append("disconnected")
+        timer.lap("interpolate")
+        timer.end_frame()
+        return events
+
+    def _interpolate(self, now):
+        snapshots = self.snapshots
+        tick = now * TICK_RATE + self.offset - self.delay
+        if tick > snapshots[-1].tick:
+            tick = snapshots[-1].tick
+            self.starved += 1
+        tick = max(tick, snapshots[0].tick)
+        i = len(snapshots) - 1
+        while snapshots[i].tick > tick:
+            i -= 1
+        before = snapshots[i]
+        after = snapshots[i + 1] if i + 1 < len(snapshots) else before
+        blend = (tick - before.tick) / (after.tick - before.tick) if after.tick > before.tick else 0.0
+
+        state = self.state
+        x, y = before.table.positions(tick)
+        state.entities.assign(before.table.records["kind"], x, y)
+        for ship, slot in enumerate(self.order):
+            if slot == self.slot:
+                state.ship_x[ship] = self.predicted_x
+                state.previous_ship_x[ship] = self.previous_x
+            else:
+                x = before.ships[slot][0] + (after.ships[slot][0] - before.ships[slot][0]) * blend
+                state.ship_x[ship] = state.previous_ship_x[ship] = x
+        state.debt = before.debt
+        state.por_active = bool(before.flags & POR_ACTIVE)
+        state.time = tick * STEP
+
+        events = []
+        state.hits = []
+        while self.hits and self.hits[0][0] <= tick:
+            _, kind, x, y = self.hits.popleft()
+            state.hits.append((kind, x, y))
+            events.append(HIT_EVENTS[kind])
+        while self.notes and self.notes[0][0] <= tick:
+            state.notifications.append(Notification(self.notes.popleft()[1], state.time))
+        if state.notifications and state.notifications[0].is_expired(state.time):
+            state.notifications = [n for n in state.notifications if not n.is_expired(state.time)]
+        if before.flags & GAME_OVER and not state.game_over:
+            state.game_over = True
+            state.game_time = before.game_time
+            events.append("game_over")
+        return events
+
+    def close(self):
+        self.channel.close()
+
+    def summary(self):
+        return {
+            "snapshots": self.received_snapshots,
+            "kb_per_second": distribution(self.traffic.kilobytes()),
+            "update_ms": self.timer.summary(),
+            "corrections": len(self.corrections),
+            "max_correction_px": round(max(self.corrections, default=0.0), 2),
+            "starved_frames": self.starved,
+            "frames": self.timer.frames,
+        }
+
+# Parse HOST[:PORT]
+def parse_address(text):
+    host, _, port = text.rpartition(":") if ":" in text else (text, "", "")
+    return host or "127.0.0.1", int(port) if port else DEFAULT_PORT
+
+# Server side of one bench run, in its own process
+def bench_server(results, swarm, seconds):
+    server = CoopServer(port=0, seed=1, swarm=swarm, once=True, measure=True)
+    results.put(server.address[1])
+    server.run(seconds)
+    results.put(server.summary())
+
+# One bench run: a local server process keeping swarm entities falling and
+# two bots playing through it at 60 frames a second for seconds
+def run_bench(swarm, seconds, policies=("chase", "sweep")):
+    results = multiprocessing.Queue()
+    server = multiprocessing.Process(target=bench_server, args=(results, swarm, seconds + 30))
+    server.start()
+    port = results.get(timeout=10)
+    bots = [CoopClient(("127.0.0.1", port), f"bot {i + 1}", measure=True) for i in range(len(policies))]
+    start = time.perf_counter()
+    frame = 0
+    while time.perf_counter() - start < seconds:
+        for bot, policy in zip(bots, policies):
+            bot.send_inputs(POLICIES[policy](bot.state))
+            bot.update()
+        frame += 1
+        time.sleep(max(0.0, start + frame * STEP - time.perf_counter()))
+    for bot in bots:
+        bot.close()
+    result = {"swarm": swarm, "seconds": seconds, "server": results.get(timeout=30),
+              "clients": [bot.summary() for bot in bots]}
+    server.join()
+    return result
+
+def print_bench(result):
+    server = result["server"]
+    tick = server["tick_ms"].get("frame", {})
+    bandwidth = server["kb_per_second_per_client"] or {}
+    delta, full = server["snapshot_bytes"]["delta"] or {}, server["snapshot_bytes"]["full"] or {}
+    print(f"swarm {result['swarm']} ({server['mean_live_entities']} live entities on average, "
+          f"{server['ticks']} ticks)")
+    print(f"  tick        p50 {tick.get('p50', 0):8.3f} ms  p99 {tick.get('p99', 0):8.3f} ms  "
+          f"max {tick.get('max', 0):8.3f} ms")
+    print(f"  bandwidth   {bandwidth.get('mean', 0):8.1f} kB/s per client (p90 {bandwidth.get('p90', 0):.1f}, "
+          f"max {bandwidth.get('max', 0):.1f})")
+    print(f"  snapshots   {delta.get('mean', 0):8.0f} bytes on average, "
+          f"{full.get('mean', 0):.0f} bytes without delta compression")
+    for i, client in enumerate(result["clients"]):
+        update = client["update_ms"].get("frame", {})
+        print(f"  client {i + 1}    update p50 {update.get('p50', 0):.3f} ms p99 {update.get('p99', 0):.3f} ms, "
+              f"{client['corrections']} corrections (max {client['max_correction_px']} px), "
+              f"{client['starved_frames']}/{client['frames']} frames past the newest snapshot")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Debt Blaster co-op server and network benchmark")
+    commands = parser.add_subparsers(dest="command", required=True)
+    serve = commands.add_parser("server", help="run a co-op server")
+    serve.add_argument("--host", default="0.0.0.0")
+    serve.add_argument("--port", type=int, default=DEFAULT_PORT)
+    serve.add_argument("--players", type=int, default=2)
+    serve.add_argument("--seed", type=int)
+    serve.add_argument("--swarm", type=int, default=0, help="keep this many enemies falling and the debt topped up")
+    serve.add_argument("--once", action="store_true", help="stop after one game")
+    bench = commands.add_parser("bench", help="measure a local server with two bots")
+    bench.add_argument("--seconds", type=float, default=10.0)
+    bench.add_argument("--swarm", type=int, action="append",
+                       help="entities kept falling (repeatable, default: 0, 1000, 5000)")
+    bench.add_argument("--output", default="netplay_results.json")
+    args = parser.parse_args()
+
+    if args.command == "server":
+        server = CoopServer(args.host, args.port, args.players, args.seed, args.swarm, args.once)
+        server.run()
+    else:
+        results = {"environment": {"commit": git_revision(), "python": platform.python_version(),
+                                   "platform": platform.platform()},
+                   "send_every": SEND_EVERY, "runs": []}
+        for swarm in args.swarm or [0, 1000, 5000]:
+            result = run_bench(swarm, args.seconds)
+            results["runs"].append(result)
+            print_bench(result)
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
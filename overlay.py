@@ -0,0 +1,74 @@
+import pygame
+
+# Performance HUD for the game loop, toggled with F3. Shows frame time, how it
+# splits into update, collisions, particle effects, draw and flip, the FPS
+# the clock measures and how many of each entity are live. Timings are
+# averaged and the text re-rendered a few times a second, so the numbers stay
+# readable and the overlay costs one blit on the frames in between.
+
+# Phases shown on the timing line, as (label, FrameTimer phases added together)
+PHASES = [
+    ("update", ("events", "movement", "network")),
+    ("collide", ("collisions",)),
+    ("fx", ("particles",)),
+    ("draw", ("draw", "text")),
+    ("flip", ("flip",)),
+]
+LINE_HEIGHT = 18
+PADDING = 6
+
+class ProfilerOverlay:
+    def __init__(self, font, right, top, interval=0.25):
+        self.font = font
+        self.right = right
+        self.top = top
+        self.interval = interval
+        self.visible = False
+        self.surface = None
+        self.totals = {}
+        self.frames = 0
+        self.last_render = None
+
+    def toggle(self):
+        self.visible = not self.visible
+        self.totals = {}
+        self.frames = 0
+        self.last_render = None
+        print(f"Profiler overlay {'on' if self.visible else 'off'}")
+
+    # Add one finished frame: timings are the FrameTimer's phase seconds and
+    # counts is a list of (label, number) pairs
+    def update(self, timings, fps, counts, now):
+        if not self.visible:
+            return
+        for phase, seconds in timings.items():
+            self.totals[phase] = self.totals.get(phase, 0.0) + seconds
+        self.frames += 1
+        if self.last_render is None or now - self.last_render >= self.interval:
+            self.render(fps, counts)
+            self.totals = {}
+            self.frames = 0
+            self.last_render = now
+
+    def render(self, fps, counts):
+        ms = {phase: seconds * 1000 / self.frames for phase, seconds in self.totals.items()}
+        split = "  ".join(f"{label} {sum(ms.get(phase, 0.0) for phase in phases):.2f}"
+                          for label, phases in PHASES)
+        lines = [
+            f"frame {ms.get('frame', 0.0):.2f} ms  fps {fps:.1f}",
+            split,
+            "  ".join(f"{label} {count}" for label, count in counts[:3]),
+            "  ".join(f"{label} {count}" for label, count in counts[3:]),
+        ]
+        rendered = [self.font.render(line, True, (255, 255, 255)) for line in lines]
+        width = max(line.get_width() for line in rendered) + 2 * PADDING
+        self.surface = pygame.Surface((width, len(lines) * LINE_HEIGHT + 2 * PADDING), pygame.SRCALPHA)
+        self.surface.fill((0, 0, 0, 160))
+        for i, line in enumerate(rendered):
+            self.surface.blit(line, (PADDING, PADDING + i * LINE_HEIGHT))
+
+    # (surface, position) pairs to draw on top of the frame
+    def texts(self):
+        if not self.visible or self.surface is None:
+            return []
+        return [(self.surface, (self.right - self.surface.get_width(), self.top))]
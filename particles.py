@@ -0,0 +1,204 @@
+import time
+from collections import namedtuple
+import numpy as np
+import pygame
+
+# Particle effects: bursts of small squares for hits, pickups and penalties.
+# Like the entity store, every particle lives in preallocated NumPy columns
+# with rows [0, count) live, so a step of motion, the lifetime check and the
+# drawing are each a handful of array operations however many particles there
+# are. Dead rows are dropped by compacting the columns, not by freeing
+# anything, and the columns never grow: capacity is a hard cap.
+#
+# Particles are drawn straight into the pixels of a 32-bit surface through
+# surfarray, fading out over their lifetime. On an opaque surface such as the
+# screen they are blended over what is there; on a surface with per-pixel
+# alpha (the texture renderer's particle layer) they are written with their
+# alpha for the renderer to blend.
+#
+# Particles are decoration, so they give way when they get expensive. Once
+# updating and drawing them costs more than budget seconds a frame, the number
+# of live particles allowed (limit) drops to what the budget affords at the
+# cost per particle just measured, and creeps back up towards the cap while
+# they are cheap again. The cost is taken once a frame, when they are drawn,
+# as the draw plus however many updates ran since the last one. Bursts are
+# spawned in full while the system is under half its limit and thinned out
+# more and more above that, so effects get sparser rather than vanishing. None of this touches the game's RNG, so
+# replays and seeded runs play out the same with or without particles.
+
+# A burst: how many particles, their speed range (px/s), lifetime range (s),
+# gravity (px/s^2), the angle range they fly out in (degrees, 0 is up) and
+# the colors they are picked from
+Effect = namedtuple("Effect", "count speed life gravity spread colors")
+
+EFFECTS = {
+    # Coins and bills flying off a moneybag
+    "hit": Effect(24, (60, 240), (0.35, 0.7), 500, (-180, 180),
+                  [(255, 215, 0), (255, 240, 120), (90, 200, 90)]),
+    # Green sparks rising from a superseed
+    "powerup": Effect(32, (40, 200), (0.5, 0.9), -150, (-60, 60),
+                      [(120, 255, 120), (200, 255, 200), (255, 255, 255)]),
+    # Red shrapnel from a loan shark
+    "penalty": Effect(48, (100, 320), (0.4, 0.8), 300, (-180, 180),
+                      [(255, 40, 40), (255, 120, 60), (150, 0, 0)]),
+    # A wide purple ring for a POR pickup
+    "por": Effect(96, (180, 260), (0.6, 1.0), 0, (-180, 180),
+                  [(180, 90, 255), (230, 180, 255), (255, 255, 255)]),
+}
+
+# The live particle limit never drops below this
+MIN_LIMIT = 256
+
+class ParticleSystem:
+    def __init__(self, width, height, capacity=8192, size=2, budget=0.0005, seed=None):
+        self.width = width
+        self.height = height
+        self.capacity = capacity
+        self.size = size
+        self.budget = budget
+        self.rng = np.random.default_rng(seed)
+        self.x = np.zeros(capacity)
+        self.y = np.zeros(capacity)
+        self.vx = np.zeros(capacity)
+        self.vy = np.zeros(capacity)
+        self.gravity = np.zeros(capacity)
+        self.age = np.zeros(capacity)
+        self.life = np.ones(capacity)
+        self.red = np.zeros(capacity, dtype=np.int32)
+        self.green = np.zeros(capacity, dtype=np.int32)
+        self.blue = np.zeros(capacity, dtype=np.int32)
+        self.count = 0
+        self.limit = capacity
+        self.cost = 0.0
+        self.update_cost = 0.0
+        self.spawned = 0
+        self.dropped = 0
+
+    def _columns(self):
+        return (self.x, self.y, self.vx, self.vy, self.gravity, self.age, self.life,
+                self.red, self.green, self.blue)
+
+    def clear(self):
+        self.count = 0
+
+    # Share of a burst that gets spawned right now
+    @property
+    def quality(self):
+        return max(0.0, min(1.0, 2.0 * (1.0 - self.count / self.limit)))
+
+    # Spawn a burst of the named effect centered on x, y. Returns how many
+    # particles it got.
+    def burst(self, name, x, y):
+        effect = EFFECTS[name]
+        n = min(round(effect.count * self.quality), self.capacity - self.count)
+        self.dropped += effect.count - n
+        if n <= 0:
+            return 0
+        rng = self.rng
+        rows = slice(self.count, self.count + n)
+        angle = np.radians(rng.uniform(*effect.spread, n))
+        speed = rng.uniform(*effect.speed, n)
+        self.x[rows] = x
+        self.y[rows] = y
+        self.vx[rows] = np.sin(angle) * speed
+        self.vy[rows] = -np.cos(angle) * speed
+        self.gravity[rows] = effect.gravity
+        self.age[rows] = 0.0
+        self.life[rows] = rng.uniform(*effect.life, n)
+        colors = np.array(effect.colors, dtype=np.int32)[rng.integers(len(effect.colors), size=n)]
+        self.red[rows] = colors[:, 0]
+        self.green[rows] = colors[:, 1]
+        self.blue[rows] = colors[:, 2]
+        self.count += n
+        self.spawned += n
+        return n
+
+    # Advance every particle by dt seconds and drop the ones that burnt out or
+    # left the screen
+    def update(self, dt):
+        start = time.perf_counter()
+        n = self.count
+        if n:
+            vy = self.vy[:n]
+            vy += self.gravity[:n] * dt
+            self.x[:n] += self.vx[:n] * dt
+            self.y[:n] += vy * dt
+            self.age[:n] += dt
+            x = self.x[:n]
+            y = self.y[:n]
+            live = (self.age[:n] < self.life[:n]) & (x > -8) & (x < self.width + 8) & (y > -8) & (y < self.height + 8)
+            kept = int(np.count_nonzero(live))
+            if kept < n:
+                for column in self._columns():
+                    column[:kept] = column[:n][live]
+                self.count = kept
+        self.update_cost += time.perf_counter() - start
+
+    def _track_cost(self, cost):
+        self.cost = cost if not self.cost else self.cost * 0.9 + cost * 0.1
+        # A few hundred particles cost next to nothing; over budget with fewer
+        # than that, the time went somewhere else
+        if self.cost > self.budget and self.count >= MIN_LIMIT:
+            self.limit = max(MIN_LIMIT, min(self.limit, int(self.count * self.budget / self.cost)))
+        elif self.cost < self.budget * 0.8 and self.limit < self.capacity:
+            self.limit = min(self.capacity, self.limit + self.capacity // 256)
+
+    # Draw every particle onto surface, alpha of the way from the previous step
+    # to the current one. Returns the rect drawn over, or None if there were
+    # no particles on screen.
+    def draw(self, surface, dt=0.0, alpha=1.0):
+        start = time.perf_counter()
+        rect = self._draw(surface, dt, alpha)
+        self._track_cost(self.update_cost + time.perf_counter() - start)
+        self.update_cost = 0.0
+        return rect
+
+    def _draw(self, surface, dt, alpha):
+        n = self.count
+        if not n or surface.get_bytesize() != 4:
+            return None
+        size = self.size
+        width, height = surface.get_size()
+        back = dt * (1.0 - alpha)
+        x = (self.x[:n] - self.vx[:n] * back).astype(np.intp)
+        y = (self.y[:n] - self.vy[:n] * back).astype(np.intp)
+        on_screen = (x >= 0) & (x <= width - size) & (y >= 0) & (y <= height - size)
+        if not on_screen.all():
+            x = x[on_screen]
+            y = y[on_screen]
+        if not len(x):
+            return None
+        # 0-256 of the way from what is underneath to the particle's color
+        fade = ((1.0 - self.age[:n] / self.life[:n]) * 256).astype(np.int32)
+        channels = (self.red[:n], self.green[:n], self.blue[:n])
+        if len(x) < n:
+            fade = fade[on_screen]
+            channels = [channel[on_screen] for channel in channels]
+
+        # Each particle is one packed color, blended over the pixel under its
+        # top left corner and written to all of its size x size pixels
+        pitch = surface.get_pitch() // 4
+        pixels = y * pitch + x
+        shifts = surface.get_shifts()
+        buffer = surface.get_buffer()
+        packed = np.frombuffer(buffer, dtype=np.uint32)
+        if surface.get_flags() & pygame.SRCALPHA:
+            out = np.minimum(fade, 255).astype(np.uint32) << shifts[3]
+            for channel, shift in zip(channels, shifts):
+                out |= channel.astype(np.uint32) << shift
+        else:
+            under = packed[pixels].astype(np.int32)
+            out = np.zeros(len(pixels), dtype=np.int32)
+            for channel, shift in zip(channels, shifts):
+                below = (under >> shift) & 255
+                out |= (below + (((channel - below) * fade) >> 8)) << shift
+        for dy in range(size):
+            for dx in range(size):
+                packed[pixels + (dy * pitch + dx)] = out
+        del packed, buffer
+        left, top = int(x.min()), int(y.min())
+        return pygame.Rect(left, top, int(x.max()) - left + size, int(y.max()) - top + size)
+
+    def report(self):
+        return (f"Particles: {self.spawned} spawned, {self.dropped} dropped, "
+                f"{self.cost * 1000:.3f} ms per frame, limit {self.limit}")
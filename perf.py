@@ -0,0 +1,170 @@
+import gc
+import os
+import subprocess
+import sys
+import time
+from collections import deque
+import numpy as np
+
+# Per-frame phase timing. A frame is split into consecutive phases by calling
+# lap(name) at the end of each one: the time since the previous lap (or since
+# begin_frame) is charged to that phase. Laps with the same name in one frame
+# add up, so code can be split across several places and still report as one
+# phase. After end_frame, current holds the finished frame's phase times; with
+# history off nothing else is kept, so a timer can run for a whole session.
+class FrameTimer:
+    def __init__(self, history=True):
+        self.history = history
+        self.samples = {}
+        self.frames = 0
+        self.current = {}
+        self.frame_start = 0.0
+        self.last = 0.0
+
+    def begin_frame(self):
+        self.current = {}
+        self.frame_start = self.last = time.perf_counter()
+
+    def lap(self, phase):
+        now = time.perf_counter()
+        self.current[phase] = self.current.get(phase, 0.0) + now - self.last
+        self.last = now
+
+    def end_frame(self):
+        self.current["frame"] = self.last - self.frame_start
+        if not self.history:
+            return
+        for phase, seconds in self.current.items():
+            samples = self.samples.get(phase)
+            if samples is None:
+                # A phase first seen late was zero in every earlier frame
+                samples = self.samples[phase] = [0.0] * self.frames
+            samples.append(seconds)
+        for phase, samples in self.samples.items():
+            if phase not in self.current:
+                samples.append(0.0)
+        self.frames += 1
+
+    # Millisecond percentiles per phase, in the order phases were first seen
+    def summary(self, percentiles=(50, 90, 99)):
+        result = {}
+        for phase, samples in self.samples.items():
+            ms = np.array(samples) * 1000
+            stats = {f"p{p}": round(float(np.percentile(ms, p)), 4) for p in percentiles}
+            stats["mean"] = round(float(ms.mean()), 4)
+            stats["max"] = round(float(ms.max()), 4)
+            result[phase] = stats
+        return result
+
+# Garbage collector activity between start() and stop(): collections and pause
+# times per generation, and how many GC-tracked objects (lists, dicts, class
+# instances and so on) were allocated without being freed straight away. That
+# last count is what drives generation 0 collections, so it is the allocation
+# churn that turns into GC pauses.
+class GcMonitor:
+    def __init__(self):
+        self.collections = [0, 0, 0]
+        self.pauses = []
+        self.allocations = 0
+        self.collection_start = 0.0
+        self.start_count = 0
+
+    def _callback(self, phase, info):
+        if phase == "start":
+            self.collection_start = time.perf_counter()
+            # Every collection resets the generation 0 count
+            self.allocations += gc.get_count()[0]
+        else:
+            self.pauses.append(time.perf_counter() - self.collection_start)
+            self.collections[info["generation"]] += 1
+
+    def start(self):
+        gc.collect()
+        self.start_count = gc.get_count()[0]
+        gc.callbacks.append(self._callback)
+
+    def stop(self):
+        gc.callbacks.remove(self._callback)
+        self.allocations += gc.get_count()[0] - self.start_count
+
+    def summary(self, frames):
+        pauses = np.array(self.pauses or [0.0]) * 1000
+        return {
+            "allocations_per_frame": round(self.allocations / frames, 2),
+            "collections": self.collections,
+            "pause_total_ms": round(float(pauses.sum()), 4),
+            "pause_max_ms": round(float(pauses.max()), 4),
+        }
+
+# Frame pacing: the wall time between consecutive presented frames, which is
+# what the player sees as smoothness (unlike FrameTimer, it includes the wait
+# in clock.tick and time handed back to the browser). Keeps the most recent
+# max_samples intervals. Frames that took more than 1.5 target intervals count
+# as late.
+class FramePacing:
+    def __init__(self, target_fps, max_samples=3600):
+        self.target = 1 / target_fps
+        self.intervals = deque(maxlen=max_samples)
+        self.last = None
+
+    def tick(self, now):
+        if self.last is not None:
+            self.intervals.append(now - self.last)
+        self.last = now
+
+    # Forget the last frame, so a pause (a menu screen) is not counted
+    def pause(self):
+        self.last = None
+
+    def reset(self):
+        self.intervals.clear()
+        self.last = None
+
+    def summary(self):
+        ms = np.array(self.intervals or [0.0]) * 1000
+        return {
+            "frames": len(self.intervals),
+            "fps": round(1000 / ms.mean(), 1) if ms.mean() else 0.0,
+            "p50": round(float(np.percentile(ms, 50)), 3),
+            "p99": round(float(np.percentile(ms, 99)), 3),
+            "max": round(float(ms.max()), 3),
+            "jitter": round(float(ms.std()), 3),
+            "late": int(np.count_nonzero(ms > self.target * 1500)),
+        }
+
+    def report(self):
+        stats = self.summary()
+        environment = "browser" if sys.platform == "emscripten" else "desktop"
+        return (f"Frame pacing ({environment}): {stats['frames']} frames at {stats['fps']} fps, "
+                f"p50 {stats['p50']:.2f} ms, p99 {stats['p99']:.2f} ms, max {stats['max']:.2f} ms, "
+                f"jitter {stats['jitter']:.2f} ms, {stats['late']} late")
+
+# Short hash of the checked out commit, recorded with measurement results
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+# Resident memory of this process in bytes, or None where it cannot be read
+# (it comes from /proc, so Linux only)
+def resident_memory():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except Exception:
+        return None
+
+# Stand-in used when nothing is being measured
+class NullTimer:
+    def begin_frame(self):
+        pass
+
+    def lap(self, phase):
+        pass
+
+    def end_frame(self):
+        pass
+
+NULL_TIMER = NullTimer()
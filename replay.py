@@ -0,0 +1,180 @@
+import argparse
+import os
+import struct
+import sys
+import time
+from game import GameState, Inputs, TICK_RATE, step
+
+# Input replays. A session log holds every game played in one run of the game
+# as the seed it started from and the inputs fed to each simulation step.
+# Since step() is deterministic, that is enough to play a game back exactly,
+# headless at full speed or drawn in real time.
+#
+# The log is a small header (magic, version, player and entity hitbox sizes)
+# followed by tagged records:
+#
+#   G seed            a game starts: the state is reset and its RNG seeded
+#   R input count     count steps (1-255) in a row with the same input byte:
+#                     bit 0 left, bit 1 right, bits 2-7 Space presses
+#   E game_time       the game ended with this game_time (checked on playback)
+#
+# Runs of identical input are merged into one record of up to 255 steps.
+# Records go out as the game runs and the file is flushed about once a
+# second, so a crash loses at most the last second; a flush ends the open run,
+# so holding a key or standing still costs three bytes a second.
+
+MAGIC = b"DBRP"
+VERSION = 1
+HEADER = struct.Struct("<4sB12H")
+SEED = struct.Struct("<Q")
+GAME_TIME = struct.Struct("<d")
+MAX_FIRE = 63
+MAX_RUN = 255
+
+def encode_inputs(inputs):
+    return bool(inputs.left) | bool(inputs.right) << 1 | min(inputs.fire, MAX_FIRE) << 2
+
+def decode_inputs(byte):
+    return Inputs(bool(byte & 1), bool(byte & 2), byte >> 2)
+
+class ReplayRecorder:
+    def __init__(self, path, player_size, sizes, flush_interval=TICK_RATE):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.file = open(path, "wb")
+        self.file.write(HEADER.pack(MAGIC, VERSION, *player_size, *[n for size in sizes for n in size]))
+        self.flush_interval = flush_interval
+        self.run_input = None
+        self.run_length = 0
+        self.since_flush = 0
+        print(f"Recording inputs to {path}")
+
+    def start_game(self, seed):
+        self._end_run()
+        self.file.write(b"G" + SEED.pack(seed))
+
+    def record(self, inputs):
+        byte = encode_inputs(inputs)
+        if byte != self.run_input or self.run_length == MAX_RUN:
+            self._end_run()
+            self.run_input = byte
+        self.run_length += 1
+        self.since_flush += 1
+        if self.since_flush >= self.flush_interval:
+            self.flush()
+
+    def end_game(self, game_time):
+        self._end_run()
+        self.file.write(b"E" + GAME_TIME.pack(game_time))
+        self.flush()
+
+    def _end_run(self):
+        if self.run_length:
+            self.file.write(bytes((ord("R"), self.run_input, self.run_length)))
+        self.run_input = None
+        self.run_length = 0
+
+    # Write out the current run so far; it carries on as a new run
+    def flush(self):
+        run_input = self.run_input
+        self._end_run()
+        self.run_input = run_input
+        self.file.flush()
+        self.since_flush = 0
+
+    def close(self):
+        self._end_run()
+        self.file.close()
+
+class ReplayGame:
+    def __init__(self, seed):
+        self.seed = seed
+        self.inputs = []
+        self.game_time = None
+
+# Read a session log. Returns the player size, the entity sizes and the games
+# in it. A log cut short by a crash is read up to its last whole record.
+def read_replay(path):
+    with open(path, "rb") as f:
+        data = f.read()
+    magic, version, *sizes = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"{path} is not a version {VERSION} replay")
+    player_size = tuple(sizes[:2])
+    entity_sizes = [tuple(sizes[i:i + 2]) for i in range(2, len(sizes), 2)]
+    games = []
+    pos = HEADER.size
+    while pos < len(data):
+        tag = data[pos:pos + 1]
+        if tag == b"G" and pos + 1 + SEED.size <= len(data):
+            games.append(ReplayGame(SEED.unpack_from(data, pos + 1)[0]))
+            pos += 1 + SEED.size
+        elif tag == b"R" and pos + 3 <= len(data) and games:
+            games[-1].inputs.extend([decode_inputs(data[pos + 1])] * data[pos + 2])
+            pos += 3
+        elif tag == b"E" and pos + 1 + GAME_TIME.size <= len(data) and games:
+            games[-1].game_time = GAME_TIME.unpack_from(data, pos + 1)[0]
+            pos += 1 + GAME_TIME.size
+        else:
+            print(f"Replay {path} ends with a partial record at byte {pos}")
+            break
+    return player_size, entity_sizes, games
+
+# Play one game back on the state, calling on_step(state) after every step
+def play(state, game, on_step=None):
+    state.reset()
+    state.rng.seed(game.seed)
+    for inputs in game.inputs:
+        step(state, inputs)
+        if on_step and on_step(state) is False:
+            break
+    return state
+
+# Draw a game at normal speed with the game's own renderer
+def play_realtime(state, game, renderer):
+    import pygame
+    import main
+
+    main.finish_loading()
+    main.use_renderer(renderer)
+    clock = pygame.time.Clock()
+
+    def draw(state):
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                return False
+        main.update_particles(state)
+        main.present(main.draw_game(state))
+        clock.tick(TICK_RATE)
+    return play(state, game, draw)
+
+# Playback: python replay.py FILE [--game N] [--realtime]
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Play back a Debt Blaster input replay")
+    parser.add_argument("replay")
+    parser.add_argument("--game", type=int, help="only play this game (counting from 0)")
+    parser.add_argument("--realtime", action="store_true", help="draw the game at normal speed")
+    parser.add_argument("--renderer", choices=["full", "dirty", "texture"], default="full")
+    args = parser.parse_args()
+
+    player_size, sizes, games = read_replay(args.replay)
+    state = GameState(player_size=player_size, sizes=sizes)
+    mismatches = 0
+    for i, game in enumerate(games):
+        if args.game is not None and i != args.game:
+            continue
+        start = time.perf_counter()
+        if args.realtime:
+            play_realtime(state, game, args.renderer)
+        else:
+            play(state, game)
+        elapsed = time.perf_counter() - start
+        result = f"game_time {state.game_time:.2f}s" if state.game_over else f"unfinished, debt ${state.debt}"
+        if game.game_time is not None:
+            matches = state.game_over and state.game_time == game.game_time
+            mismatches += not matches
+            result += f" ({'matches' if matches else 'recorded %.2fs, MISMATCH' % game.game_time})"
+        print(f"Game {i} (seed {game.seed}): {len(game.inputs)} steps in {elapsed:.2f}s, {result}")
+    sys.exit(1 if mismatches else 0)
@@ -0,0 +1,49 @@
+import pygame
+from collections import OrderedDict
+
+# LRU cache of rendered text. An outlined string is rasterized once: the
+# outline is stamped at the eight offsets around the text and the text drawn
+# on top, all into one transparent surface, so a steady HUD line costs a
+# single blit per frame and no font rendering at all. Entries are keyed by
+# (text, font, color, outline color, outline width) and the least recently
+# used entry is dropped once the cache is full.
+class TextCache:
+    def __init__(self, capacity=128):
+        self.capacity = capacity
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def clear(self):
+        self.entries.clear()
+
+    # Surface for the text, with its outline included when outline_color is
+    # given. The text itself starts outline_width pixels in from the top left.
+    def render(self, text, font, color, outline_color=None, outline_width=2):
+        key = (text, font, color, outline_color, outline_width)
+        surface = self.entries.get(key)
+        if surface is not None:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return surface
+        self.misses += 1
+        surface = self._compose(text, font, color, outline_color, outline_width)
+        self.entries[key] = surface
+        if len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+        return surface
+
+    def _compose(self, text, font, color, outline_color, outline_width):
+        text_surface = font.render(text, True, color)
+        if outline_color is None:
+            return text_surface
+        outline_surface = font.render(text, True, outline_color)
+        w = outline_width
+        surface = pygame.Surface((text_surface.get_width() + 2 * w, text_surface.get_height() + 2 * w),
+                                 pygame.SRCALPHA)
+        for dx in (-w, 0, w):
+            for dy in (-w, 0, w):
+                if dx or dy:
+                    surface.blit(outline_surface, (w + dx, w + dy))
+        surface.blit(text_surface, (w, w))
+        return surface
@@ -0,0 +1,97 @@
+import pygame
+from pygame._sdl2.video import Renderer, Texture, Window
+
+# Texture renderer for the gameplay screen. Instead of blitting surfaces onto
+# the screen surface, it draws through the SDL renderer behind pygame's SCALED
+# display mode: every sprite, background and piece of HUD text is uploaded to
+# a texture the first time it is drawn, and after that a frame is only texture
+# copies. On accelerated drivers those run on the GPU; on a headless box SDL's
+# software renderer does the same job. The game draws at its logical 800x600
+# and SDL scales the finished frame to the window, so a bigger or fullscreen
+# window costs the game nothing extra.
+#
+# Textures are keyed by the surface they were made from. Sprites and
+# backgrounds keep theirs for as long as the renderer lives. HUD text surfaces
+# come and go as the text changes (the text cache and the profiler overlay
+# hand out new ones), so a text texture is only kept while its surface is
+# still being drawn. Effects that draw into pixels (the particles) go into a
+# transparent layer the size of the screen, of which only the part they
+# covered this frame or last is cleared and uploaded again.
+class TextureRenderer:
+    def __init__(self, background=None, fill_color=(0, 0, 0)):
+        self.renderer = Renderer.from_window(Window.from_display_module())
+        self.fill_color = pygame.Color(fill_color)
+        self.textures = {}
+        self.text_textures = {}
+        self.uploads = 0
+        self.layer = None
+        self.layer_texture = None
+        self.layer_rect = None
+        self.set_background(background)
+
+    def set_background(self, background):
+        self.background = background
+        self.background_opaque = (background is not None and not background.get_flags() & pygame.SRCALPHA
+                                  and background.get_colorkey() is None)
+
+    def _upload(self, surface):
+        self.uploads += 1
+        return Texture.from_surface(self.renderer, surface)
+
+    def texture(self, surface):
+        texture = self.textures.get(surface)
+        if texture is None:
+            texture = self.textures[surface] = self._upload(surface)
+        return texture
+
+    def _draw_effects(self, effects):
+        if self.layer is None:
+            self.layer = pygame.Surface(pygame.display.get_surface().get_size(), pygame.SRCALPHA)
+            self.layer_texture = Texture(self.renderer, self.layer.get_size(), streaming=True)
+            self.layer_texture.blend_mode = pygame.BLENDMODE_BLEND
+        layer = self.layer
+        previous = self.layer_rect
+        if previous:
+            layer.fill((0, 0, 0, 0), previous)
+        rect = effects(layer)
+        changed = rect.union(previous) if rect and previous else rect or previous
+        if changed:
+            self.layer_texture.update(layer.subsurface(changed), changed)
+        if rect:
+            self.layer_texture.draw(rect, rect)
+        self.layer_rect = rect
+
+    # Draw one frame, taking the same batches, texts and effects as
+    # DirtyRenderer.draw(). The frame is shown by present(), not
+    # pygame.display.flip().
+    def draw(self, batches, texts, timer, effects=None):
+        renderer = self.renderer
+        if not self.background_opaque:
+            renderer.draw_color = self.fill_color
+            renderer.clear()
+        if self.background is not None:
+            self.texture(self.background).draw()
+
+        for surface, color, size, positions in batches:
+            if surface is not None:
+                draw = self.texture(surface).draw
+                for position in positions:
+                    draw(None, position)
+            else:
+                renderer.draw_color = pygame.Color(color)
+                for position in positions:
+                    renderer.fill_rect((position, size))
+        if effects:
+            self._draw_effects(effects)
+        timer.lap("draw")
+
+        text_textures = {}
+        for surface, position in texts:
+            texture = self.text_textures.get(surface) or self._upload(surface)
+            text_textures[surface] = texture
+            texture.draw(None, position)
+        self.text_textures = text_textures
+        timer.lap("text")
+
+    def present(self):
+        self.renderer.present()